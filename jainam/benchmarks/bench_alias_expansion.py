@@ -0,0 +1,64 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import ALIAS_VALUES, expand_aliases
+
+
+def expand_aliases_loop(df):
+    # Row-by-row expansion the engine used before, kept as the reference
+    new_rows = []
+    for _, row in df.iterrows():
+        new_rows.append(row.to_dict())
+        for alias in ALIAS_VALUES:
+            empty_row = {col: np.nan for col in df.columns}
+            empty_row['Alais'] = alias
+            new_rows.append(empty_row)
+    df = pd.DataFrame(new_rows).reset_index(drop=True)
+    df['Alias'] = df['Alias'].fillna(df['Alais'])
+    return df.drop(columns=['Alais'])
+
+
+def make_section(n_users, seed=0):
+    # Capital Deployed section as it comes out of the re-headered daily sheet
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        np.nan: rng.uniform(0, 100, n_users).round(1),
+        'IDs': [f"JM{1000 + i}" for i in range(n_users)],
+        'Alias': [f"jm{1000 + i}" for i in range(n_users)],
+        'Total': rng.uniform(0, 5, n_users),
+    }, dtype=object)
+    df['Allocation'] = rng.uniform(0, 500, n_users)
+    # Section headers can repeat; the sheets carry a second Total further along
+    df.insert(len(df.columns), 'Total', rng.uniform(0, 5, n_users), allow_duplicates=True)
+    return df
+
+
+def timed(func, df):
+    start = time.perf_counter()
+    result = func(df)
+    return result, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Alias-row expansion: row loop vs vectorized")
+    parser.add_argument('--sizes', nargs='+', type=int, default=[100, 1_000, 10_000, 100_000])
+    args = parser.parse_args(argv)
+
+    print(f"{'users':>8} {'loop (s)':>10} {'vectorized (s)':>15} {'speedup':>8}")
+    for n in args.sizes:
+        df = make_section(n)
+        expected, loop_time = timed(expand_aliases_loop, df)
+        result, vector_time = timed(expand_aliases, df)
+        pd.testing.assert_frame_equal(result, expected)
+        print(f"{n:>8} {loop_time:>10.4f} {vector_time:>15.4f} {loop_time / vector_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine
+import ledger
+import mtm_store
+import record_index
+import result_cache
+from cache import frame_cache
+
+
+def parse_date(value):
+    return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def cold(func):
+    # Nothing cached, no Record index, columnar store or ledger, as for a first run
+    frame_cache.clear()
+    with tempfile.TemporaryDirectory() as tmp:
+        record_index.INDEX_DIR = os.path.join(tmp, 'record_index')
+        mtm_store.STORE_DIR = os.path.join(tmp, 'mtm_store')
+        result_cache.RESULT_DIR = os.path.join(tmp, 'result_cache')
+        ledger.LEDGER_DIR = os.path.join(tmp, 'ledger')
+        start = time.perf_counter()
+        result = func()
+        return result, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="A month of dates: one process() per day vs process_range()")
+    parser.add_argument('--mtm', required=True, help="Compiled MTM Sheet (xlsx/csv)")
+    parser.add_argument('--allocation', required=True, help="Jainam Daily Allocation workbook")
+    parser.add_argument('--daily', required=True, help="Updated JAINAM DAILY workbook")
+    parser.add_argument('--sheet', required=True, help="Monthly sheet name, e.g. JULY 2025")
+    parser.add_argument('--start', required=True, type=parse_date, help="First date (YYYY-MM-DD)")
+    parser.add_argument('--end', required=True, type=parse_date, help="Last date (YYYY-MM-DD)")
+    args = parser.parse_args(argv)
+
+    # Everything in this process, where the cache locations are overridden
+    engine.LOAD_WORKERS = 1
+    files = (args.mtm, args.allocation, args.daily, args.sheet)
+    dates = [args.start + datetime.timedelta(days=n) for n in range((args.end - args.start).days + 1)]
+
+    expected, errors = {}, {}
+    per_day = 0.0
+    for date in dates:
+        try:
+            expected[date], elapsed = cold(lambda: engine.process(*files, date))
+        except engine.ProcessingError as e:
+            errors[date] = str(e)
+            continue
+        per_day += elapsed
+
+    (outputs, range_errors), range_time = cold(lambda: engine.process_range(*files, dates))
+
+    assert outputs.keys() == expected.keys()
+    for date in dates:
+        if date in expected:
+            pd.testing.assert_frame_equal(outputs[date], expected[date])
+        else:
+            assert str(range_errors[date]) == errors[date]
+    print(f"{'dates':>6} {'reconciled':>11} {'per day (s)':>12} {'range (s)':>10} {'speedup':>8}")
+    print(f"{len(dates):>6} {len(outputs):>11} {per_day:>12.3f} {range_time:>10.3f} {per_day / range_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
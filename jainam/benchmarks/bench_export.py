@@ -0,0 +1,73 @@
+import argparse
+import datetime
+import os
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import to_csv, to_excel
+
+
+def make_output(n_rows, rng):
+    # Shaped like process(): section text columns, one column per trading day and sparse alias rows
+    users = np.array([f"JM{1000 + n}" for n in range(n_rows)], dtype=object)
+    users[rng.random(n_rows) < 0.5] = np.nan
+    days = [datetime.datetime(2025, 7, 1) + datetime.timedelta(days=n) for n in range(5)]
+    df = pd.DataFrame({'User ID': users, 'Component': rng.choice(['VT', 'GB', 'PS', 'RD', 'RM'], n_rows),
+                       'Total': rng.uniform(0, 5, n_rows).round(2)})
+    for day in days:
+        df[day] = rng.uniform(-1, 1, n_rows)
+    df['Capital Deployed'] = rng.uniform(0, 1e6, n_rows).round(2)
+    df['MTM'] = rng.uniform(-5e4, 5e4, n_rows).round(2)
+    df['|'] = '|'
+    df['User ID (SL)'] = users
+    df['Component (SL)'] = df['Component']
+    df['Max Loss'] = rng.uniform(-2e4, 0, n_rows).round(2)
+    return df
+
+
+def excel_writer(df):
+    # The export before streaming: pd.ExcelWriter builds the whole sheet in memory first
+    buffer = BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        df.to_excel(writer, sheet_name='Sheet1', index=False)
+    return buffer.getvalue()
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak / 2 ** 20
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Output export: pd.ExcelWriter vs write-only workbook vs CSV")
+    parser.add_argument('--rows', nargs='+', type=int, default=[1_000, 10_000, 50_000])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'rows':>7} {'writer (s)':>11} {'writer (MB)':>12} {'stream (s)':>11} {'stream (MB)':>12} "
+          f"{'csv (s)':>8} {'csv (MB)':>9}")
+    for n_rows in args.rows:
+        df = make_output(n_rows, rng)
+        expected, writer_time, writer_peak = measure(lambda: excel_writer(df))
+        result, stream_time, stream_peak = measure(lambda: to_excel(df))
+        _, csv_time, csv_peak = measure(lambda: to_csv(df))
+        pd.testing.assert_frame_equal(pd.read_excel(BytesIO(result)), pd.read_excel(BytesIO(expected)))
+        print(f"{n_rows:>7} {writer_time:>11.3f} {writer_peak:>12.1f} {stream_time:>11.3f} {stream_peak:>12.1f} "
+              f"{csv_time:>8.3f} {csv_peak:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine
+import ledger
+from bench_pipeline import cold_run, inputs_for
+
+# Month-to-date figures from the ledger vs reprocessing the month: a cold process_range() over every
+# trading day, then each day recorded in turn as a run would, and the month's summaries read back.
+# The summary built up a day at a time is checked against one computed from all the days at once.
+
+
+def expected_summary(outputs):
+    frame = pd.concat([ledger.entries(output) for output in outputs.values()], ignore_index=True)
+    groups = frame.groupby(ledger.KEYS, sort=False)
+    return pd.DataFrame({
+        'Days': groups.size(),
+        'MTM': groups['MTM'].sum(min_count=1),
+        'Peak Capital Deployed': groups['Capital Deployed'].max(),
+        'Worst Max Loss': groups['Max Loss'].min(),
+    }).reset_index()
+
+
+def best_of(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Month-to-date from the ledger vs reprocessing the month")
+    parser.add_argument('--users', nargs='+', type=int, default=[1_000, 10_000])
+    parser.add_argument('--month', default='2025-07', help="Month of the synthetic daily sheet (YYYY-MM)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(f"{'users':>7} {'days':>5} {'reprocess (s)':>14} {'record/day (ms)':>16} "
+          f"{'month (ms)':>11} {'one user (ms)':>14} {'daily (ms)':>11}")
+    for users in args.users:
+        inputs = inputs_for(users, args.month, None, args.seed, 'xlsx')
+        files, sheet, dates = inputs['files'], inputs['sheet'], inputs['dates']
+        result = {}
+        profile = cold_run(lambda profile: result.update(outputs=engine.process_range(*files, sheet, dates, profile=profile)[0]))
+        outputs = result['outputs']
+
+        with tempfile.TemporaryDirectory() as tmp:
+            ledger.LEDGER_DIR = tmp
+            appends = []
+            for date, output in outputs.items():
+                start = time.perf_counter()
+                ledger.record({date: output})
+                appends.append(time.perf_counter() - start)
+            month = ledger.month_of(dates[0])
+            summary = ledger.month_to_date(month)
+            pd.testing.assert_frame_equal(summary, expected_summary(outputs), check_dtype=False)
+            user = summary['User ID'].iloc[len(summary) // 2]
+            month_time = best_of(lambda: ledger.month_to_date(month), args.repeat)
+            user_time = best_of(lambda: ledger.month_to_date(month, user), args.repeat)
+            daily_time = best_of(lambda: ledger.daily_totals(month), args.repeat)
+
+        print(f"{users:>7} {len(outputs):>5} {profile['total_seconds']:>14.2f} {statistics.median(appends) * 1000:>16.1f} "
+              f"{month_time * 1000:>11.1f} {user_time * 1000:>14.1f} {daily_time * 1000:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import FILE1_COLUMNS, match_date_rows, read_mtm_csv
+
+
+def write_history(path, n_users, n_days, rng):
+    # Compiled MTM history: one row per user and trading day, with the columns file1 carries
+    users = np.array([f"JM{1000 + n}" for n in range(n_users)])
+    start = datetime.datetime(2023, 1, 2, 15, 30)
+    with open(path, 'w', newline='') as f:
+        for day in range(n_days):
+            df = pd.DataFrame({
+                'SNO': np.arange(n_users) + day * n_users + 1,
+                'Enabled': True,
+                'UserID': users,
+                'Broker': 'X',
+                'Total Orders': rng.integers(0, 50, n_users),
+                'MTM (All)': rng.uniform(-5e4, 5e4, n_users).round(2),
+                'ALLOCATION': rng.uniform(0.1, 5, n_users).round(2),
+                'MAX LOSS': rng.uniform(-2e4, 0, n_users).round(2),
+                'SERVER': 'S1',
+                'Date': (start + datetime.timedelta(days=day)).strftime('%Y-%m-%d %H:%M:%S'),
+            })
+            df.to_csv(f, index=False, header=day == 0)
+    return list(users), start + datetime.timedelta(days=n_days // 2)
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak / 2 ** 20
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compiled MTM CSV: whole-file read vs chunked stream")
+    parser.add_argument('--users', type=int, default=1_000)
+    parser.add_argument('--days', nargs='+', type=int, default=[50, 250, 750])
+    parser.add_argument('--chunk-rows', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'rows':>9} {'whole (s)':>10} {'whole (MB)':>11} {'chunked (s)':>12} {'chunked (MB)':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n_days in args.days:
+            path = os.path.join(tmp, f"mtm_{n_days}.csv")
+            ids, date = write_history(path, args.users, n_days, rng)
+
+            def whole():
+                df = pd.read_csv(path, usecols=lambda name: name in FILE1_COLUMNS)
+                return match_date_rows(df, ids, date)
+
+            def chunked():
+                return match_date_rows(read_mtm_csv(path, ids, [date], chunksize=args.chunk_rows), ids, date)
+
+            expected, whole_time, whole_peak = measure(whole)
+            result, chunked_time, chunked_peak = measure(chunked)
+            pd.testing.assert_frame_equal(result.reset_index(drop=True), expected.reset_index(drop=True))
+            print(f"{args.users * n_days:>9} {whole_time:>10.3f} {whole_peak:>11.1f} "
+                  f"{chunked_time:>12.3f} {chunked_peak:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
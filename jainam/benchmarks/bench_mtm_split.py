@@ -0,0 +1,113 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import ALIAS_VALUES, split_mtm
+
+
+def split_mtm_loop(df):
+    # Row-by-row split the engine used before, kept as the reference
+    df = df.copy()
+    i = 0
+    while i < len(df):
+        if pd.notna(df.at[i, 'IDs']):
+            main_mtm = df.at[i, 'MTM']
+            component_indices = []
+            j = i + 1
+            while j < len(df) and pd.isna(df.at[j, 'IDs']):
+                if not pd.isna(df.at[j, 'Allocation']):
+                    component_indices.append(j)
+                j += 1
+            total_allocation = df.loc[component_indices, 'Allocation'].sum()
+            if total_allocation > 0 and pd.notna(main_mtm):
+                for idx in component_indices:
+                    allocation = df.at[idx, 'Allocation']
+                    proportion = allocation / total_allocation
+                    df.at[idx, 'MTM'] = round(main_mtm * proportion, 2)
+            i = j
+        else:
+            i += 1
+    return df
+
+
+def make_book(n_users, rng):
+    # User rows followed by their component rows, with the awkward cases mixed in:
+    # NaN/zero/negative allocations, NaN user MTM and orphan rows before the first user
+    ids, aliases, allocation, mtm = [], [], [], []
+    for _ in range(rng.integers(0, 3)):
+        ids.append(np.nan), aliases.append('PS'), allocation.append(rng.uniform(0, 1e7)), mtm.append(np.nan)
+    for n in range(n_users):
+        ids.append(f"JM{1000 + n}")
+        aliases.append(f"jm{1000 + n}")
+        allocation.append(rng.uniform(0, 500))
+        mtm.append(np.nan if rng.random() < 0.1 else rng.uniform(-1e5, 1e5))
+        for alias in ALIAS_VALUES[:rng.integers(0, len(ALIAS_VALUES) + 1)]:
+            ids.append(np.nan)
+            aliases.append(alias)
+            roll = rng.random()
+            if roll < 0.15:
+                allocation.append(np.nan)
+            elif roll < 0.3:
+                allocation.append(0.0)
+            elif roll < 0.33:
+                allocation.append(-rng.uniform(0, 1e7))
+            else:
+                allocation.append(rng.uniform(0, 1e7))
+            mtm.append(np.nan)
+    return pd.DataFrame({'IDs': ids, 'Alias': aliases, 'Allocation': allocation, 'MTM': mtm})
+
+
+def loaded_forms(df):
+    # The book as built (float64), and as it comes when file3 is a CSV: read_csv leaves the
+    # section columns that mix text and figures as objects, so Allocation (filled from the
+    # section's own figures) or every column can hold objects
+    return {
+        'float64': df,
+        'object Allocation': df.astype({'Allocation': object}),
+        'object columns': df.astype(object),
+    }
+
+
+def check_equivalence(rounds, seed):
+    rng = np.random.default_rng(seed)
+    for _ in range(rounds):
+        book = make_book(int(rng.integers(0, 200)), rng)
+        for form, df in loaded_forms(book).items():
+            try:
+                pd.testing.assert_frame_equal(split_mtm(df), split_mtm_loop(df), check_exact=True)
+            except AssertionError as e:
+                raise AssertionError(f"{form} book: {e}") from None
+    print(f"split_mtm matches the row loop on {rounds} random books, each as {', '.join(loaded_forms(book))}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Proportional MTM split: row loop vs group-wise")
+    parser.add_argument('--sizes', nargs='+', type=int, default=[100, 1_000, 10_000, 100_000])
+    parser.add_argument('--check-rounds', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    check_equivalence(args.check_rounds, args.seed)
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'users':>8} {'loop (s)':>10} {'group-wise (s)':>15} {'speedup':>8}")
+    for n in args.sizes:
+        df = make_book(n, rng)
+        start = time.perf_counter()
+        expected = split_mtm_loop(df)
+        loop_time = time.perf_counter() - start
+        start = time.perf_counter()
+        result = split_mtm(df)
+        vector_time = time.perf_counter() - start
+        pd.testing.assert_frame_equal(result, expected)
+        print(f"{n:>8} {loop_time:>10.4f} {vector_time:>15.4f} {loop_time / vector_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
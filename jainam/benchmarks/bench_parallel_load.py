@@ -0,0 +1,64 @@
+import argparse
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run(args):
+    # One cold process() in this process: fresh cache directory, warm worker pool
+    import engine
+
+    if engine.LOAD_WORKERS > 1:
+        pool = engine.load_pool()
+        for future in [pool.submit(os.getpid) for _ in range(engine.LOAD_WORKERS)]:
+            future.result()
+    start = time.perf_counter()
+    output = engine.process(args.mtm, args.allocation, args.daily, args.sheet, args.date)
+    elapsed = time.perf_counter() - start
+    with open(args.out, 'wb') as f:
+        pickle.dump((output, elapsed), f)
+
+
+def measure(args, workers, tmp):
+    out = os.path.join(tmp, f"out_{workers}.pkl")
+    env = dict(os.environ, JAINAM_LOAD_WORKERS=str(workers),
+               JAINAM_CACHE_DIR=tempfile.mkdtemp(dir=tmp))
+    subprocess.run([sys.executable, os.path.abspath(__file__), '--run', '--out', out,
+                    '--mtm', args.mtm, '--allocation', args.allocation, '--daily', args.daily,
+                    '--sheet', args.sheet, '--date', args.date], env=env, check=True)
+    with open(out, 'rb') as f:
+        return pickle.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Input loading: one file after another vs concurrent workers")
+    parser.add_argument('--mtm', required=True, help="Compiled MTM Sheet (xlsx/csv)")
+    parser.add_argument('--allocation', required=True, help="Jainam Daily Allocation workbook")
+    parser.add_argument('--daily', required=True, help="Updated JAINAM DAILY workbook")
+    parser.add_argument('--sheet', required=True, help="Monthly sheet name, e.g. JULY 2025")
+    parser.add_argument('--date', required=True, help="Date to process (YYYY-MM-DD)")
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--run', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--out', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run:
+        return run(args)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        serial, serial_time = measure(args, 1, tmp)
+        parallel, parallel_time = measure(args, args.workers, tmp)
+    pd.testing.assert_frame_equal(serial, parallel)
+    print(f"{'serial (s)':>11} {'concurrent (s)':>15} {'speedup':>8}")
+    print(f"{serial_time:>11.3f} {parallel_time:>15.3f} {serial_time / parallel_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
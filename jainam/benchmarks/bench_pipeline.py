@@ -0,0 +1,147 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine
+import ledger
+import mtm_store
+import record_index
+import result_cache
+from cache import CACHE_DIR, frame_cache
+from profiling import RunProfile
+from synthetic import make_inputs
+
+# End-to-end and per-stage timings of process() for one day and process_range() for the month, on
+# synthetic inputs at each scale. Inputs are generated once per (users, month, days, seed, format)
+# and kept under JAINAM_CACHE_DIR/benchmarks; every run is cold (no frame cache, Record index or
+# columnar store to start from) and runs with the result cache and the ledger turned off, as with
+# JAINAM_RESULT_CACHE_MB=0 and JAINAM_LEDGER_DIR='', so no profile has their stages. Results are
+# saved as JSON so later runs can be compared with --compare.
+INPUTS_DIR = os.path.join(CACHE_DIR, 'benchmarks')
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def inputs_for(users, month, days, seed, mtm_format):
+    directory = os.path.join(INPUTS_DIR, f"{users}u_{month}_{days or 'all'}d_s{seed}_{mtm_format}")
+    done = os.path.join(directory, 'inputs.json')
+    if os.path.exists(done):
+        with open(done) as f:
+            entry = json.load(f)
+        entry['dates'] = [datetime.date.fromisoformat(date) for date in entry['dates']]
+        return entry
+    mtm, allocation, daily, sheet, dates = make_inputs(directory, users, month, days, seed, mtm_format)
+    entry = {'files': [mtm, allocation, daily], 'sheet': sheet, 'dates': dates}
+    with open(done, 'w') as f:
+        json.dump(entry, f, default=str)
+    return entry
+
+
+def cold_run(func):
+    frame_cache.clear()
+    result_cache.MAX_MB = 0
+    ledger.LEDGER_DIR = ''
+    with tempfile.TemporaryDirectory() as tmp:
+        record_index.INDEX_DIR = os.path.join(tmp, 'record_index')
+        mtm_store.STORE_DIR = os.path.join(tmp, 'mtm_store')
+        profile = RunProfile()
+        func(profile)
+        return profile.record()
+
+
+def median_run(records):
+    # The repeat with the median end-to-end time, so stages and total come from the same run
+    records = sorted(records, key=lambda record: record['total_seconds'])
+    return records[len(records) // 2]
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous, current):
+    # Stage by stage, seconds then -> now, for the scales and modes both runs measured
+    before = {(run['users'], run['mode']): run for run in previous['runs']}
+    for run in current['runs']:
+        old = before.get((run['users'], run['mode']))
+        if old is None:
+            continue
+        print(f"\n{run['users']} users, {run['mode']} (vs {previous['commit'] or previous['timestamp']})")
+        old_stages = {stage['stage']: stage['seconds'] for stage in old['stages']}
+        rows = [(stage['stage'], old_stages.get(stage['stage']), stage['seconds']) for stage in run['stages']]
+        rows.append(('total', old['total_seconds'], run['total_seconds']))
+        for name, then, now in rows:
+            change = f"{now / then:>6.2f}x" if then else ''
+            then = f"{then:.3f}" if then is not None else '-'
+            print(f"  {name:<40} {then:>9} {now:>9.3f} {change}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stage by stage on synthetic inputs")
+    parser.add_argument('--users', nargs='+', type=int, default=[1_000, 10_000, 100_000])
+    parser.add_argument('--month', default='2025-07', help="Month of the synthetic daily sheet (YYYY-MM)")
+    parser.add_argument('--days', type=int, help="Only the first N trading days of the month")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--mtm-format', choices=['xlsx', 'csv'],
+                        help="Compiled MTM format (default: xlsx up to 10k users, csv above)")
+    parser.add_argument('--repeat', type=int, default=3, help="Cold runs per measurement; the median is kept")
+    parser.add_argument('--modes', nargs='+', choices=['single', 'range'], default=['single', 'range'])
+    parser.add_argument('--out', help="Results file (default: results/<timestamp>.json next to this script)")
+    parser.add_argument('--compare', help="Earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    now = datetime.datetime.now()
+    results = {
+        'timestamp': now.isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'load_workers': engine.LOAD_WORKERS,
+        'runs': [],
+    }
+    for users in args.users:
+        mtm_format = args.mtm_format or ('xlsx' if users <= 10_000 else 'csv')
+        inputs = inputs_for(users, args.month, args.days, args.seed, mtm_format)
+        files, sheet, dates = inputs['files'], inputs['sheet'], inputs['dates']
+        for mode in args.modes:
+            if mode == 'single':
+                run = lambda profile: engine.process(*files, sheet, dates[len(dates) // 2], profile=profile)
+            else:
+                run = lambda profile: engine.process_range(*files, sheet, dates, profile=profile)
+            record = median_run([cold_run(run) for _ in range(args.repeat)])
+            record.update(users=users, mode=mode, dates=1 if mode == 'single' else len(dates),
+                          mtm_format=mtm_format)
+            del record['event']
+            results['runs'].append(record)
+            print(f"{users:>7} users {mode:>6} ({record['dates']} dates): {record['total_seconds']:.3f} s")
+            for stage in record['stages']:
+                print(f"    {stage['stage']:<40} {stage['seconds']:>9.3f} s {stage['rows'] or '':>9} rows "
+                      f"{stage['peak_rss_mb'] or 0:>8.1f} MB peak")
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{now.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=1, default=str)
+    print(f"\nsaved {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine
+from bench_pipeline import cold_run, inputs_for
+
+# How soon a bad upload is turned back: the time a cold run takes to raise its first error
+# (engine._process, which has no preflight) against engine.preflight(), which reads the sheet names,
+# header rows and file3 markers out of the workbooks and lists every problem at once. The bad
+# inputs are the synthetic ones with a header or a marker renamed in the sheet XML.
+
+
+def rewrite(path, directory, old, new):
+    # Copy of an .xlsx with the first `old` in its worksheets replaced by `new`
+    out = os.path.join(directory, f"{len(os.listdir(directory))}_{os.path.basename(path)}")
+    found = False
+    with zipfile.ZipFile(path) as src, zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as dst:
+        for info in src.infolist():
+            data = src.read(info)
+            if not found and info.filename.startswith('xl/worksheets/') and old in data:
+                data = data.replace(old, new, 1)
+                found = True
+            dst.writestr(info, data)
+    if not found:
+        raise ValueError(f"{old!r} not found in {path}")
+    return out
+
+
+def cases(inputs, directory):
+    # (case, file1, file2, file3, sheet name)
+    mtm, allocation, daily = inputs['files']
+    sheet = inputs['sheet']
+    no_max_loss = rewrite(mtm, directory, b'>MAX LOSS<', b'>MAX_LOSS<')
+    no_max_sl = rewrite(daily, directory, b'>Max SL<', b'>Max  SL<')
+    return [
+        ("valid inputs", mtm, allocation, daily, sheet),
+        ("wrong sheet name", mtm, allocation, daily, sheet.lower()),
+        ("file1 without MAX LOSS", no_max_loss, allocation, daily, sheet),
+        ("file3 without Max SL", mtm, allocation, no_max_sl, sheet),
+        # file3 in place of file2, which has no 'Record' sheet
+        ("a problem in every file", no_max_loss, daily, no_max_sl, sheet),
+    ]
+
+
+def full_run(files, sheet, date):
+    # Seconds to the end of a cold run or to its first error, and that error
+    result = {}
+
+    def run(profile):
+        try:
+            engine._process(*files, sheet, date, lambda value: None, profile)
+        except engine.ProcessingError as e:
+            result['error'] = str(e)
+
+    return cold_run(run)['total_seconds'], result.get('error')
+
+
+def preflight(files, sheet, repeat):
+    times = []
+    problems = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            engine.preflight(*files, sheet)
+            problems = []
+        except engine.PreflightError as e:
+            problems = e.problems
+        times.append(time.perf_counter() - start)
+    return min(times), problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time to report bad uploads: full run vs preflight")
+    parser.add_argument('--users', nargs='+', type=int, default=[1_000, 10_000])
+    parser.add_argument('--month', default='2025-07', help="Month of the synthetic daily sheet (YYYY-MM)")
+    parser.add_argument('--days', type=int, default=5, help="Only the first N trading days of the month")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    for users in args.users:
+        inputs = inputs_for(users, args.month, args.days, args.seed, 'xlsx')
+        date = inputs['dates'][0]
+        print(f"{users} users, {date}")
+        print(f"  {'case':<24} {'full run (s)':>13} {'preflight (ms)':>15}  problems")
+        with tempfile.TemporaryDirectory() as tmp:
+            for case, *files, sheet in cases(inputs, tmp):
+                seconds, error = full_run(files, sheet, date)
+                preflight_seconds, problems = preflight(files, sheet, args.repeat)
+                print(f"  {case:<24} {seconds:>13.2f} {preflight_seconds * 1000:>15.1f}  {len(problems)}")
+                if error is not None:
+                    print(f"    full run: {error}")
+                for problem in problems:
+                    print(f"    preflight: {problem}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine
+import ledger
+import record_index
+import result_cache
+from cache import frame_cache
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def run_backend(backend, args):
+    # Cold run: nothing cached and no Record index, so every workbook is parsed by `backend`.
+    # Loads stay in this process, where the backend and index directory are set.
+    engine.EXCEL_BACKEND = backend
+    engine.LOAD_WORKERS = 1
+    frame_cache.clear()
+    timings = {}
+    with tempfile.TemporaryDirectory() as index_dir:
+        record_index.INDEX_DIR = index_dir
+        _, timings['mtm'] = timed(lambda: engine.read_excel_frame(args.mtm, columns=engine.FILE1_COLUMNS))
+        _, timings['daily'] = timed(lambda: engine.read_excel_frame(args.daily, args.sheet, stop_marker=engine.FILE3_LAST_MARKER))
+
+        def scan_record():
+            record = engine.RecordSheet(args.allocation)
+            try:
+                return engine.scan_record(record.rows(), engine._target_date(args.date))
+            finally:
+                record.close()
+
+        _, timings['allocation'] = timed(scan_record)
+
+    frame_cache.clear()
+    with tempfile.TemporaryDirectory() as index_dir:
+        record_index.INDEX_DIR = index_dir
+        result_cache.RESULT_DIR = os.path.join(index_dir, 'result_cache')
+        ledger.LEDGER_DIR = os.path.join(index_dir, 'ledger')
+        output, timings['process'] = timed(
+            lambda: engine.process(args.mtm, args.allocation, args.daily, args.sheet, args.date))
+    return output, timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the Excel reader backends on real workbooks")
+    parser.add_argument('--mtm', required=True, help="Compiled MTM Sheet (xlsx)")
+    parser.add_argument('--allocation', required=True, help="Jainam Daily Allocation workbook")
+    parser.add_argument('--daily', required=True, help="Updated JAINAM DAILY workbook")
+    parser.add_argument('--sheet', required=True, help="Monthly sheet name, e.g. JULY 2025")
+    parser.add_argument('--date', required=True, help="Date to process (YYYY-MM-DD)")
+    parser.add_argument('--backends', nargs='+', default=['openpyxl', 'calamine'])
+    args = parser.parse_args(argv)
+
+    outputs = {}
+    print(f"{'backend':>10} {'mtm (s)':>9} {'daily (s)':>10} {'allocation (s)':>15} {'process (s)':>12}")
+    for backend in args.backends:
+        if backend == 'calamine' and engine.python_calamine is None:
+            print(f"{backend:>10} skipped: python-calamine is not installed")
+            continue
+        outputs[backend], t = run_backend(backend, args)
+        print(f"{backend:>10} {t['mtm']:>9.3f} {t['daily']:>10.3f} {t['allocation']:>15.3f} {t['process']:>12.3f}")
+
+    # The reconciliation must not depend on the reader
+    results = list(outputs.values())
+    for other in results[1:]:
+        pd.testing.assert_frame_equal(results[0], other)
+    if len(results) > 1:
+        print("outputs are identical across backends")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import FILE3_LAST_MARKER, read_file, split_sections, type_section
+from synthetic import make_users, sheet_name, trading_days, write_daily_sheet
+
+# Splitting a parsed file3 into its sections: a full scan of the first column per marker and a
+# copied slice per section (the old code) against one scan and shallow slices (split_sections()).
+# split_sections() also types each section (type_section(): float figure columns, categorical
+# labels), which is most of its time now; the old code left that to later steps. The reference is
+# timed without and with the same typing, and the speedup is taken against the typed reference.
+
+
+def extract_section_copying(df, label):
+    # Per-section copy the engine used before, kept as the reference
+    df = df.drop(index=df.index[0]).reset_index(drop=True)
+    df.columns = df.iloc[0]
+    df = df.drop(index=0).reset_index(drop=True)
+    df = df[:-1]
+    if 'IDs' not in df.columns:
+        raise ValueError(f"'IDs' column not found in {label} section")
+    return df
+
+
+def split_sections_scanning(df3):
+    # One full scan of the first column per marker, then a copied slice per section
+    mtm_row_index = df3[df3["Unnamed: 0"] == "MTM"].index[0]
+    capital_deployed_row_index = df3[df3["Unnamed: 0"] == "Capital Deployed"].index[0]
+    max_loss_row_index = df3[df3["Unnamed: 0"] == "Max SL"].index[0]
+    AVG_row_index = df3[df3["Unnamed: 0"] == "AVG %"].index[0]
+    return (extract_section_copying(df3.iloc[mtm_row_index:capital_deployed_row_index + 1], 'MTM'),
+            extract_section_copying(df3.iloc[capital_deployed_row_index:max_loss_row_index + 1], 'Capital Deployed'),
+            extract_section_copying(df3.iloc[max_loss_row_index:AVG_row_index + 1], 'Max SL'))
+
+
+def daily_sheet(directory, n_users, month, seed):
+    rng = np.random.default_rng(seed)
+    users, aliases = make_users(n_users)
+    path = write_daily_sheet(os.path.join(directory, f"daily_{n_users}.xlsx"), sheet_name(month),
+                             users, aliases, trading_days(month), rng)
+    return read_file(path, sheet=sheet_name(month), stop_marker=FILE3_LAST_MARKER)
+
+
+def best_of(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="file3 sections: a scan per marker vs one scan")
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1_000, 10_000, 100_000])
+    parser.add_argument('--month', default='2025-07')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    def scanning_typed():
+        return [type_section(section) for section in split_sections_scanning(df3)]
+
+    print(f"{'users':>8} {'rows':>8} {'per marker (s)':>15} {'+ typing (s)':>13} {'one scan (s)':>13} "
+          f"{'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            df3 = daily_sheet(tmp, n, args.month, args.seed)
+            for result, expected in zip(split_sections(df3), scanning_typed()):
+                pd.testing.assert_frame_equal(result, expected, check_names=False)
+            scanning = best_of(lambda: split_sections_scanning(df3), args.repeat)
+            typed = best_of(scanning_typed, args.repeat)
+            single = best_of(lambda: split_sections(df3), args.repeat)
+            print(f"{n:>8} {len(df3):>8} {scanning:>15.4f} {typed:>13.4f} {single:>13.4f} {typed / single:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
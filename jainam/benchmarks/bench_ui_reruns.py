@@ -0,0 +1,217 @@
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import jobs
+from bench_pipeline import inputs_for
+
+# What each interaction on the results page costs: the time from the widget change reaching a
+# `streamlit run` server until the rerun it triggers has finished, the way a browser sees it.
+# The app runs against a finished job on synthetic inputs; --baseline REV runs app.py from that
+# git revision as well, so the two can be compared. AppTest cannot show this, since it always
+# reruns the whole script, even for widgets in a fragment or a form.
+USERNAME = "Access_User"
+PASSWORD = "Jainam@135"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(app_path, port):
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [APP_DIR, os.environ.get('PYTHONPATH')]))}
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'streamlit', 'run', app_path, '--server.headless', 'true',
+         '--server.port', str(port), '--browser.gatherUsageStats', 'false'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1):
+                return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f"streamlit did not start for {app_path}")
+
+
+class Session:
+    # One browser tab: the widget values it has sent so far and the widgets last drawn
+    def __init__(self, ws, query_string):
+        self.ws = ws
+        self.query_string = query_string
+        self.states = {}
+        self.widgets = {}
+
+    async def rerun(self, changed=(), fragment_id=''):
+        msg = BackMsg()
+        msg.rerun_script.query_string = self.query_string
+        msg.rerun_script.fragment_id = fragment_id
+        for state in changed:
+            if state.WhichOneof('value') != 'trigger_value':
+                self.states[state.id] = state
+        triggers = [state for state in changed if state.WhichOneof('value') == 'trigger_value']
+        msg.rerun_script.widget_states.widgets.extend([*self.states.values(), *triggers])
+        start = time.perf_counter()
+        await self.ws.send(msg.SerializeToString())
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await self.ws.recv())
+            kind = forward.WhichOneof('type')
+            if kind == 'delta' and forward.delta.WhichOneof('type') == 'new_element':
+                element = forward.delta.new_element
+                element_type = element.WhichOneof('type')
+                if element_type == 'exception':
+                    raise RuntimeError(element.exception.message)
+                widget = getattr(element, element_type)
+                if getattr(widget, 'id', ''):
+                    self.widgets[widget.id] = (element_type, widget, forward.delta.fragment_id)
+            # A script that calls st.rerun() finishes early and runs again
+            elif kind == 'script_finished' and forward.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                return time.perf_counter() - start
+
+    def find(self, element_type, match):
+        for widget_type, widget, fragment_id in reversed(list(self.widgets.values())):
+            if widget_type == element_type and match(widget):
+                return widget, fragment_id
+        raise LookupError(f"no {element_type} widget on the page")
+
+    async def change(self, element_type, match, **value):
+        # Send one widget's new value the way the browser would; None if it does not rerun
+        widget, fragment_id = self.find(element_type, match)
+        state = WidgetState(id=widget.id, **value)
+        if getattr(widget, 'form_id', ''):
+            # Fields in a form only go to the server with the form's submit button
+            self.states[state.id] = state
+            return None
+        return await self.rerun([state], fragment_id)
+
+
+# (interaction, widget type, how to find it, the values it goes through)
+INTERACTIONS = [
+    ("Toggle theme", 'button', lambda w: w.id.endswith('theme_toggle'),
+     [{'trigger_value': True}]),
+    ("Type a sheet name", 'text_input', lambda w: w.placeholder.startswith('Enter sheet name'),
+     [{'string_value': 'JULY 2025'}, {'string_value': 'AUGUST 2025'}]),
+    ("Pick a date", 'date_input', lambda w: not w.is_range,
+     [{'string_array_value': {'data': ['2025-07-02']}}, {'string_array_value': {'data': ['2025-07-03']}}]),
+    ("Switch date range on/off", 'checkbox', lambda w: w.id.endswith('range_mode'),
+     [{'bool_value': True}, {'bool_value': False}]),
+    ("Change the file type", 'radio', lambda w: w.label == 'File type',
+     [{'string_value': 'CSV (.csv)'}, {'string_value': 'Excel (.xlsx)'}]),
+    ("Go to another results page", 'number_input', lambda w: w.id.endswith('view_page'),
+     [{'int_value': 2}, {'int_value': 3}]),
+    ("Search the results", 'text_input', lambda w: w.id.endswith('view_query'),
+     [{'string_value': 'jm1000'}, {'string_value': 'ps'}]),
+    ("Sort the results", 'selectbox', lambda w: w.id.endswith('view_sort'),
+     [{'string_value': 'Component'}, {'string_value': 'User ID'}]),
+]
+
+
+async def measure(port, job_id, repeat):
+    async with websockets.connect(f"ws://127.0.0.1:{port}/_stcore/stream", subprotocols=['streamlit'],
+                                  max_size=None) as ws:
+        session = Session(ws, f"job={job_id}")
+        await session.rerun()
+        username, _ = session.find('text_input', lambda w: w.placeholder == 'Username')
+        password, _ = session.find('text_input', lambda w: w.placeholder == 'Password')
+        login, _ = session.find('button', lambda w: w.id.endswith('login_btn'))
+        session.states[username.id] = WidgetState(id=username.id, string_value=USERNAME)
+        session.states[password.id] = WidgetState(id=password.id, string_value=PASSWORD)
+        loaded = await session.rerun([WidgetState(id=login.id, trigger_value=True)])
+        session.find('radio', lambda w: w.label == 'File type')
+
+        timings = {"Log in and load the results": loaded}
+        for name, element_type, match, values in INTERACTIONS:
+            try:
+                session.find(element_type, match)
+            except LookupError:
+                timings[name] = 'n/a'
+                continue
+            times = []
+            for n in range(repeat):
+                times.append(await session.change(element_type, match, **values[n % len(values)]))
+            timings[name] = None if None in times else statistics.median(times)
+        return timings
+
+
+def app_at(revision, directory):
+    # app.py as it was at a git revision
+    source = subprocess.run(['git', 'show', f"{revision}:./app.py"], cwd=APP_DIR,
+                            capture_output=True, text=True, check=True).stdout
+    path = os.path.join(directory, 'app.py')
+    with open(path, 'w') as f:
+        f.write(source)
+    return path
+
+
+def run_app(app_path, job_id, repeat):
+    port = free_port()
+    server = start_server(app_path, port)
+    try:
+        return asyncio.run(measure(port, job_id, repeat))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def cell(seconds):
+    if seconds is None:
+        return f"{'no rerun':>12}"
+    if isinstance(seconds, str):
+        return f"{seconds:>12}"
+    return f"{seconds * 1000:>12.0f}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rerun cost of each interaction with the Streamlit app")
+    parser.add_argument('--users', type=int, default=2_000)
+    parser.add_argument('--month', default='2025-07', help="Month of the synthetic daily sheet (YYYY-MM)")
+    parser.add_argument('--days', type=int, default=5, help="Only the first N trading days of the month")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=6, help="Times each interaction is repeated; the median is kept")
+    parser.add_argument('--baseline', help="Git revision whose app.py to measure as well, e.g. HEAD~1")
+    args = parser.parse_args(argv)
+
+    inputs = inputs_for(args.users, args.month, args.days, args.seed, 'xlsx')
+    job_id = jobs.submit(*inputs['files'], inputs['sheet'], inputs['dates'][:1])
+    jobs.work(stop_when_idle=True)
+    if jobs.status(job_id)['status'] != 'done':
+        raise RuntimeError(jobs.status(job_id)['error'])
+
+    columns = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.baseline:
+            try:
+                columns[args.baseline] = run_app(app_at(args.baseline, tmp), job_id, args.repeat)
+            except RuntimeError as e:
+                # e.g. an app that cannot show results this large
+                print(f"{args.baseline}: {e}")
+                columns[args.baseline] = {}
+        columns['working tree'] = run_app(os.path.join(APP_DIR, 'app.py'), job_id, args.repeat)
+
+    print(f"{args.users} users, results of {inputs['dates'][0]}; median ms from the change to the end of the rerun")
+    print(f"{'interaction':<30}" + "".join(f"{name:>14}" for name in columns))
+    for name in columns['working tree']:
+        print(f"{name:<30}" + "".join(f"  {cell(timings.get(name, 'failed'))}" for timings in columns.values()))
+
+
+if __name__ == '__main__':
+    main()
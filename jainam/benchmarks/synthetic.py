@@ -0,0 +1,182 @@
+import argparse
+import datetime
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import openpyxl
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import ALIAS_VALUES, FILE2_HEADER
+
+# Synthetic inputs in the layouts the engine reads, seeded so the same arguments always give the
+# same workbooks. Users are JM<n>; on each trading day about `absent` of them have no Compiled MTM
+# row and no allocation row, and a few Compiled MTM users are not in the daily sheet at all.
+# With integer_values, the Compiled MTM figures are whole numbers, as some exports write them, and
+# each day's MAX LOSS values are distinct; with absent=0 as well, every lookup of a user's figures
+# then matches one to one, next to the group total rows that have no IDs.
+FILE1_HEADER = ['SNO', 'Enabled', 'LoggedIn', 'SqOff Done', 'UserID', 'Broker', 'Qty Multiplier',
+                'Available Margin', 'Total Orders', 'Total Lots', 'MTM (All)', 'ALLOCATION', 'MAX LOSS',
+                'SERVER', 'Date']
+GROUP_SIZE = 25
+
+
+def trading_days(month, days=None):
+    # Weekdays of the month ('2025-07'), optionally only the first `days` of them
+    start = pd.Timestamp(f"{month}-01")
+    dates = [day.date() for day in pd.bdate_range(start, start + pd.offsets.MonthEnd(0))]
+    return dates[:days] if days else dates
+
+
+def sheet_name(month):
+    return pd.Timestamp(f"{month}-01").strftime('%B %Y').upper()
+
+
+def make_users(n_users):
+    users = np.array([f"JM{10000 + n}" for n in range(n_users)], dtype=object)
+    return users, np.array([user.lower() for user in users], dtype=object)
+
+
+def present(rng, n_users, dates, absent):
+    # (dates x users) mask of who traded on each day
+    return rng.random((len(dates), n_users)) >= absent
+
+
+def _save(workbook, path):
+    tmp = f"{path}.tmp"
+    workbook.save(tmp)
+    os.replace(tmp, path)
+
+
+def write_compiled_mtm(path, users, dates, mask, rng, extra_users=0, integer_values=False):
+    # file1: one row per user and trading day, with every column of the real export
+    frames = []
+    others = np.array([f"XX{n}" for n in range(extra_users)], dtype=object)
+    for n, date in enumerate(dates):
+        ids = np.concatenate([users[mask[n]], others])
+        count = len(ids)
+        frame = pd.DataFrame({
+            'SNO': 0,
+            'Enabled': True,
+            'LoggedIn': True,
+            'SqOff Done': rng.random(count) < 0.9,
+            'UserID': ids,
+            'Broker': rng.choice(['Zerodha', 'Angel', 'Fyers'], count),
+            'Qty Multiplier': rng.integers(1, 5, count),
+            'Available Margin': rng.uniform(1e5, 5e7, count).round(2),
+            'Total Orders': rng.integers(0, 200, count),
+            'Total Lots': rng.integers(0, 100, count),
+            'MTM (All)': rng.normal(0, 2e4, count).round(2),
+            'ALLOCATION': rng.uniform(0.1, 10, count).round(2),
+            'MAX LOSS': -rng.uniform(1e3, 5e4, count).round(2),
+            'SERVER': rng.choice(['S1', 'S2', 'S3'], count),
+            'Date': datetime.datetime.combine(date, datetime.time(15, 30)),
+        })
+        if integer_values:
+            # Drawn after the rest, so the other columns match the inputs without the option
+            frame['MTM (All)'] = frame['MTM (All)'].round().astype(int)
+            frame['ALLOCATION'] = rng.integers(1, 10, count)
+            frame['MAX LOSS'] = -rng.choice(np.arange(1_000, 1_000 + 50 * count), count, replace=False)
+        frames.append(frame)
+    df = pd.concat(frames, ignore_index=True)
+    df['SNO'] = np.arange(1, len(df) + 1)
+
+    if path.endswith('.csv'):
+        df.to_csv(path, index=False)
+        return path
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('Sheet1')
+    sheet.append(FILE1_HEADER)
+    for row in df.itertuples(index=False, name=None):
+        sheet.append([value.item() if isinstance(value, np.generic) else value for value in row])
+    _save(workbook, path)
+    return path
+
+
+def write_allocation_record(path, users, dates, mask, rng):
+    # file2: the 'Record' sheet, one dated UserID block per trading day closed by a Total row
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('Record')
+    sheet.append(['JAINAM DAILY ALLOCATION RECORD'])
+    components = [name for name in FILE2_HEADER if name in ALIAS_VALUES]
+    for n, date in enumerate(dates):
+        ids = users[mask[n]]
+        values = rng.uniform(0, 2, (len(ids), len(components))).round(2)
+        values[rng.random(values.shape) < 0.2] = 0
+        totals = values.sum(axis=1).round(2)
+        max_loss = -rng.uniform(1e3, 5e4, len(ids)).round(2)
+        algos = rng.choice(['A1', 'A2', 'B1'], len(ids))
+
+        sheet.append([datetime.datetime.combine(date, datetime.time())])
+        sheet.append(FILE2_HEADER)
+        for user, algo, row, total, loss in zip(ids, algos, values.tolist(), totals.tolist(), max_loss.tolist()):
+            sheet.append([user, user.lower(), str(algo)] + row + [total, loss])
+        sheet.append(['Total', None, None] + values.sum(axis=0).round(2).tolist() + [float(totals.sum()), None])
+        sheet.append([])
+    _save(workbook, path)
+    return path
+
+
+def write_daily_sheet(path, name, users, aliases, dates, rng):
+    # file3: the monthly sheet with its MTM, Capital Deployed and Max SL sections, one column per
+    # trading day, a group total row every GROUP_SIZE users, and the AVG % section that ends it
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(name)
+    sheet.append([None, f"JAINAM DAILY {name}"])
+    day_columns = [datetime.datetime.combine(date, datetime.time()) for date in dates]
+    for marker, scale in (('MTM', 2e4), ('Capital Deployed', 1e7), ('Max SL', 5e4)):
+        sheet.append([marker])
+        sheet.append([None, 'IDs', 'Alias', 'Total'] + day_columns)
+        figures = rng.uniform(0, scale, len(users)).round(2)
+        daily = rng.normal(0, scale / 10, (len(users), len(dates))).round(2)
+        for n, (user, alias) in enumerate(zip(users, aliases)):
+            sheet.append([float(figures[n]), user, alias, float(daily[n].sum())] + daily[n].tolist())
+            if (n + 1) % GROUP_SIZE == 0:
+                sheet.append([None, None, 'Group total', float(daily[n + 1 - GROUP_SIZE:n + 1].sum())])
+    sheet.append(['AVG %'])
+    sheet.append([None, 'IDs', 'Alias', 'AVG %'])
+    _save(workbook, path)
+    return path
+
+
+def make_inputs(directory, n_users, month='2025-07', days=None, seed=0, mtm_format='xlsx', absent=0.05,
+                integer_values=False):
+    # Write the three inputs into directory; returns (mtm, allocation, daily, sheet name, dates)
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    dates = trading_days(month, days)
+    users, aliases = make_users(n_users)
+    mask = present(rng, n_users, dates, absent)
+    name = sheet_name(month)
+    mtm = write_compiled_mtm(os.path.join(directory, f"compiled_mtm.{mtm_format}"), users, dates, mask, rng,
+                             extra_users=max(1, n_users // 100), integer_values=integer_values)
+    allocation = write_allocation_record(os.path.join(directory, 'daily_allocation.xlsx'), users, dates, mask, rng)
+    daily = write_daily_sheet(os.path.join(directory, 'updated_daily.xlsx'), name, users, aliases, dates, rng)
+    return mtm, allocation, daily, name, dates
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write synthetic Jainam inputs at a chosen scale")
+    parser.add_argument('out_dir', help="Directory for the three workbooks")
+    parser.add_argument('--users', type=int, default=1_000)
+    parser.add_argument('--month', default='2025-07', help="Month of the daily sheet (YYYY-MM)")
+    parser.add_argument('--days', type=int, help="Only the first N trading days of the month")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--mtm-format', choices=['xlsx', 'csv'], default='xlsx')
+    parser.add_argument('--absent', type=float, default=0.05, help="Share of users missing on each day")
+    parser.add_argument('--integer-values', action='store_true',
+                        help="Whole-number Compiled MTM figures, with distinct MAX LOSS values per day")
+    args = parser.parse_args(argv)
+
+    mtm, allocation, daily, name, dates = make_inputs(args.out_dir, args.users, args.month, args.days,
+                                                      args.seed, args.mtm_format, args.absent,
+                                                      args.integer_values)
+    print(f"{len(dates)} trading days of {name} for {args.users} users:")
+    for path in (mtm, allocation, daily):
+        print(f"  {path} ({os.path.getsize(path) / 2 ** 20:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+# Local directory for indexes and caches that outlive a single run
+CACHE_DIR = os.environ.get('JAINAM_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'jainam'))
+
+
+def content_hash(source):
+    # sha256 of an uploaded file or a path on disk, leaving uploads rewound
+    digest = hashlib.sha256()
+    if hasattr(source, 'getvalue'):
+        digest.update(source.getvalue())
+    elif hasattr(source, 'read'):
+        source.seek(0)
+        for chunk in iter(lambda: source.read(1 << 20), b''):
+            digest.update(chunk)
+        source.seek(0)
+    else:
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class LRUCache:
+    # Thread-safe LRU bounded by entry count and by the total size reported on put()
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            self._items.move_to_end(key)
+            return item[0]
+
+    def put(self, key, value, size):
+        with self._lock:
+            if key in self._items:
+                self._bytes -= self._items.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._items[key] = (value, size)
+            self._bytes += size
+            while len(self._items) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self._bytes -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+
+# Parsed input frames keyed by (content hash, sheet). Module level, so it survives Streamlit
+# reruns and is shared by every session served by the process. Cached frames are read-only.
+frame_cache = LRUCache(
+    max_entries=int(os.environ.get('JAINAM_FRAME_CACHE_ENTRIES', 16)),
+    max_bytes=int(os.environ.get('JAINAM_FRAME_CACHE_MB', 1024)) * 1024 * 1024,
+)
@@ -0,0 +1,169 @@
+import argparse
+import datetime
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import openpyxl
+
+import engine
+from engine import ProcessingError, process, process_range, to_excel
+from profiling import RunProfile, log_profile
+
+
+def parse_date(value):
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid date format: {value}. Please use YYYY-MM-DD.")
+
+
+def default_sheet_name(date):
+    # Monthly sheets of the Updated JAINAM DAILY workbook are named like 'JULY 2025'
+    return date.strftime('%B %Y').upper()
+
+
+def index_daily_workbooks(directory):
+    # Map sheet name -> workbook path for every workbook in the directory
+    sheets = {}
+    for name in sorted(os.listdir(directory)):
+        if os.path.splitext(name)[1].lower() != '.xlsx' or name.startswith('~$'):
+            continue
+        path = os.path.join(directory, name)
+        wb = openpyxl.load_workbook(path, read_only=True)
+        try:
+            for sheet in wb.sheetnames:
+                sheets.setdefault(sheet, path)
+        finally:
+            wb.close()
+    return sheets
+
+
+def build_jobs(args):
+    if args.dates:
+        dates = args.dates
+    else:
+        if not (args.start and args.end):
+            raise SystemExit("Either --dates or both --start and --end are required.")
+        days = (args.end - args.start).days
+        dates = [args.start + datetime.timedelta(days=n) for n in range(days + 1)]
+
+    sheets = index_daily_workbooks(args.daily) if os.path.isdir(args.daily) else None
+    jobs = []
+    for date in dates:
+        sheet_name = args.sheet or default_sheet_name(date)
+        daily = args.daily
+        if sheets is not None:
+            daily = sheets.get(sheet_name)
+            if daily is None:
+                print(f"{date}: no workbook in {args.daily} has a '{sheet_name}' sheet, skipped", file=sys.stderr)
+                continue
+        jobs.append((date, daily, sheet_name))
+    return jobs
+
+
+def init_worker(log_profiles=False):
+    # Each date already runs in a process of its own, so it parses its three files in turn
+    engine.LOAD_WORKERS = 1
+    if log_profiles:
+        logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+
+def write_output(output, date, out_dir):
+    path = os.path.join(out_dir, f"jainam_{date.strftime('%Y-%m-%d')}.xlsx")
+    with open(path, 'wb') as f:
+        f.write(to_excel(output))
+    return path
+
+
+def run_job(mtm, allocation, daily, sheet_name, date, out_dir):
+    profile = RunProfile()
+    try:
+        path = write_output(process(mtm, allocation, daily, sheet_name, date, profile=profile), date, out_dir)
+    except Exception:
+        log_profile(profile.record(status='failed', sheet_name=sheet_name, dates=[date]))
+        raise
+    profile.lap("Write output")
+    log_profile(profile.record(status='done', sheet_name=sheet_name, dates=[date]))
+    return path
+
+
+def run_range_job(mtm, allocation, daily, sheet_name, dates, out_dir):
+    # All dates of one monthly sheet in a single pass: {date: path or error}
+    profile = RunProfile()
+    try:
+        outputs, errors = process_range(mtm, allocation, daily, sheet_name, dates, profile=profile)
+    except Exception:
+        log_profile(profile.record(status='failed', sheet_name=sheet_name, dates=dates))
+        raise
+    results = dict(errors)
+    for date, output in outputs.items():
+        results[date] = write_output(output, date, out_dir)
+    profile.lap("Write outputs", sum(len(output) for output in outputs.values()))
+    log_profile(profile.record(status='done', sheet_name=sheet_name, dates=dates))
+    return results
+
+
+def report(date, result):
+    # Print one date's outcome; True if it failed
+    if isinstance(result, ProcessingError):
+        print(f"{date}: {result}", file=sys.stderr)
+    elif isinstance(result, Exception):
+        print(f"{date}: Error processing files: {str(result)}", file=sys.stderr)
+    else:
+        print(f"{date}: wrote {result}")
+        return False
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Jainam reconciliation for many dates in parallel.")
+    parser.add_argument('--mtm', required=True, help="Compiled MTM Sheet (xlsx/csv)")
+    parser.add_argument('--allocation', required=True, help="Jainam Daily Allocation workbook")
+    parser.add_argument('--daily', required=True,
+                        help="Updated JAINAM DAILY workbook, or a directory of monthly workbooks")
+    parser.add_argument('--sheet', help="Sheet name in the daily workbook (default: month of each date, e.g. JULY 2025)")
+    parser.add_argument('--dates', nargs='+', type=parse_date, help="Dates to process (YYYY-MM-DD)")
+    parser.add_argument('--start', type=parse_date, help="First date of a range (inclusive)")
+    parser.add_argument('--end', type=parse_date, help="Last date of a range (inclusive)")
+    parser.add_argument('--out-dir', default='.', help="Directory for the jainam_<date>.xlsx outputs")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument('--single-pass', action='store_true',
+                        help="Parse each monthly sheet once and reconcile all of its dates together")
+    parser.add_argument('--profile', action='store_true',
+                        help="Log each run's per-stage timings and memory to stderr as JSON lines")
+    args = parser.parse_args(argv)
+
+    jobs = build_jobs(args)
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(args.profile,)) as pool:
+        if args.single_pass:
+            months = {}
+            for date, daily, sheet_name in jobs:
+                months.setdefault((daily, sheet_name), []).append(date)
+            futures = {
+                pool.submit(run_range_job, args.mtm, args.allocation, daily, sheet_name, dates, args.out_dir): dates
+                for (daily, sheet_name), dates in months.items()
+            }
+        else:
+            futures = {
+                pool.submit(run_job, args.mtm, args.allocation, daily, sheet_name, date, args.out_dir): [date]
+                for date, daily, sheet_name in jobs
+            }
+        for future in as_completed(futures):
+            try:
+                results = future.result()
+                if not isinstance(results, dict):
+                    results = {futures[future][0]: results}
+            except Exception as e:
+                results = {date: e for date in futures[future]}
+            for date, result in results.items():
+                failed += report(date, result)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
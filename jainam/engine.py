@@ -0,0 +1,1532 @@
+import csv
+import datetime
+import os
+import threading
+import warnings
+from concurrent.futures import Future, ProcessPoolExecutor
+from io import BytesIO, TextIOWrapper
+from multiprocessing import get_context
+
+import numpy as np
+import openpyxl
+import pandas as pd
+from openpyxl.cell.cell import ERROR_CODES, Cell, WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+from pandas.errors import EmptyDataError
+from pandas.io.parsers import TextParser
+from pandas.tseries.api import guess_datetime_format
+
+try:
+    import python_calamine
+except ImportError:
+    python_calamine = None
+
+# Strings read_excel takes as missing by default. pandas keeps the set in a private module, so
+# this falls back to a copy of it (as of pandas 2.2) if the module moves.
+try:
+    from pandas._libs.parsers import STR_NA_VALUES
+except ImportError:
+    STR_NA_VALUES = {
+        '-1.#IND', '1.#QNAN', '1.#IND', '-1.#QNAN', '#N/A N/A', '#N/A', 'N/A', 'n/a', 'NA', '<NA>',
+        '#NA', 'NULL', 'null', 'NaN', '-NaN', 'nan', '-nan', 'None', '',
+    }
+
+import ledger
+import mtm_store
+import record_index
+import result_cache
+import sheet_probe
+from cache import content_hash, frame_cache
+from profiling import NO_PROFILE
+
+# Suppress SettingWithCopyWarning
+warnings.filterwarnings('ignore', category=pd.errors.SettingWithCopyWarning)
+
+# Excel reader: 'openpyxl', 'calamine', or 'auto' to use calamine when python-calamine is installed
+EXCEL_BACKEND = os.environ.get('JAINAM_EXCEL_BACKEND', 'auto')
+
+# Worker processes that parse the three uploads of a run concurrently; 1 parses them in turn
+LOAD_WORKERS = int(os.environ.get('JAINAM_LOAD_WORKERS', min(3, os.cpu_count() or 1)))
+
+# Component codes every user is split into
+ALIAS_VALUES = ['PS', 'VT', 'GB', 'RD', 'RM']
+
+# Column layout of a UserID block in the 'Record' sheet of file2
+FILE2_HEADER = ['UserID', 'User Alias', 'Algo', 'VT', 'GB', 'PS', 'RD', 'RM', 'ALLOCATION', 'MAX LOSS']
+
+# Columns of file1 the reconciliation actually reads
+FILE1_COLUMNS = ['UserID', 'Date', 'MTM (All)', 'ALLOCATION', 'MAX LOSS']
+
+# Rows per chunk when a Compiled MTM CSV is streamed instead of read whole
+CSV_CHUNK_ROWS = int(os.environ.get('JAINAM_CSV_CHUNK_ROWS', 100_000))
+
+# Marker in the first column of file3 after which nothing is read
+FILE3_LAST_MARKER = 'AVG %'
+
+# Section markers in the first column of file3, in sheet order; each section ends at the next marker
+FILE3_SECTIONS = ['MTM', 'Capital Deployed', 'Max SL', FILE3_LAST_MARKER]
+
+# Label columns of the file3 sections; every other column holds figures
+SECTION_LABELS = ['IDs', 'Alias']
+
+# Columns of file1 that are not needed after the date match
+FILE1_DROP_COLUMNS = ['Date', 'SNO', 'Enabled', 'LoggedIn', 'SqOff Done',
+                      'Broker', 'Qty Multiplier', 'Available Margin', 'Total Orders',
+                      'Total Lots', 'SERVER', 'Unnamed: 16', 'Unnamed: 17',
+                      'Unnamed: 18', 'Unnamed: 19', 'Unnamed: 20']
+
+
+class ProcessingError(Exception):
+    """Base class for reconciliation errors; the message is shown to the user as is."""
+
+
+class InputFileError(ProcessingError):
+    """An uploaded file could not be read or is empty."""
+
+
+class SchemaError(ProcessingError):
+    """A required column or section is missing from an input."""
+
+
+class NoDataError(ProcessingError):
+    """The inputs contain no rows for the requested date."""
+
+
+class PreflightError(ProcessingError):
+    """The uploads failed the checks made before parsing; every problem found is listed, one per line."""
+
+    def __init__(self, problems):
+        super().__init__("\n".join(problems))
+        self.problems = list(problems)
+
+    def __reduce__(self):
+        return PreflightError, (self.problems,)
+
+
+def source_name(source):
+    # Uploaded files carry a .name, paths on disk are used as is
+    name = getattr(source, 'name', None)
+    return name if name is not None else os.fspath(source)
+
+
+def _excel_cell(value):
+    # What read_excel makes of a cell value before inferring column types
+    if value is None:
+        return ""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value) if int(value) == value else float(value)
+    if isinstance(value, str) and value in ERROR_CODES:
+        return np.nan
+    return value
+
+
+def excel_backend():
+    if EXCEL_BACKEND == 'auto':
+        return 'calamine' if python_calamine is not None else 'openpyxl'
+    return EXCEL_BACKEND
+
+
+def _calamine_value(value):
+    # Bring calamine values in line with openpyxl's, so both backends feed identical rows
+    if value == "":
+        return None
+    if isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+        return datetime.datetime(value.year, value.month, value.day)
+    return value
+
+
+def iter_sheet_values(file, sheet=None, backend=None):
+    # Raw cell values of one sheet, row by row, from the first row of the sheet
+    backend = backend or excel_backend()
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    if backend == 'calamine':
+        if python_calamine is None:
+            raise ImportError("python-calamine is not installed")
+        wb = python_calamine.load_workbook(file)
+        if sheet is None:
+            ws = wb.get_sheet_by_index(0)
+        elif sheet in wb.sheet_names:
+            ws = wb.get_sheet_by_name(sheet)
+        else:
+            raise ValueError(f"Worksheet named '{sheet}' not found")
+        for row in ws.iter_rows():
+            yield [_calamine_value(value) for value in row]
+        return
+
+    wb = openpyxl.load_workbook(file, read_only=True, data_only=True, keep_links=False)
+    try:
+        if sheet is None:
+            ws = wb.worksheets[0]
+        elif sheet in wb.sheetnames:
+            ws = wb[sheet]
+        else:
+            raise ValueError(f"Worksheet named '{sheet}' not found")
+        # Trust the rows actually present, not the declared dimensions
+        ws.reset_dimensions()
+        yield from ws.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def read_excel_frame(file, sheet=None, columns=None, stop_marker=None, backend=None):
+    # read_excel restricted to the requested sheet, the header columns listed in `columns` and
+    # the rows up to the one whose first cell is `stop_marker`. Other sheets, columns and
+    # formatting are never materialized.
+    data = []
+    picks = None
+    last_row_with_data = -1
+    rows = iter_sheet_values(file, sheet, backend)
+    try:
+        for row in rows:
+            if picks is None and columns is not None:
+                header = [_excel_cell(value) for value in row]
+                picks = [i for i, name in enumerate(header) if name in columns and header.index(name) == i]
+            if picks is not None:
+                row = [row[i] if i < len(row) else None for i in picks]
+            converted = [_excel_cell(value) for value in row]
+            while converted and converted[-1] == "":
+                converted.pop()
+            if converted:
+                last_row_with_data = len(data)
+            data.append(converted)
+            if stop_marker is not None and converted and converted[0] == stop_marker:
+                break
+    finally:
+        rows.close()
+
+    # Trim trailing empty rows and pad the rest to the same width, as read_excel does
+    data = data[:last_row_with_data + 1]
+    if data:
+        width = max(len(row) for row in data)
+        data = [row + [""] * (width - len(row)) for row in data]
+    try:
+        return TextParser(data, header=0, skip_blank_lines=False).read()
+    except EmptyDataError:
+        return pd.DataFrame()
+
+
+def _parse_file(file, ext, sheet, columns, stop_marker):
+    if ext == '.csv':
+        if hasattr(file, 'seek'):
+            file.seek(0)
+        return pd.read_csv(file, usecols=None if columns is None else (lambda name: name in columns))
+    return read_excel_frame(file, sheet, columns, stop_marker)
+
+
+class Upload(BytesIO):
+    # An upload reduced to its bytes and name, so that it can be sent to a worker process
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+
+    def __reduce__(self):
+        return Upload, (self.getvalue(), self.name)
+
+
+def _portable(source):
+    if isinstance(source, (str, os.PathLike)):
+        return source
+    if hasattr(source, 'getvalue'):
+        return Upload(source.getvalue(), source_name(source))
+    source.seek(0)
+    data = source.read()
+    source.seek(0)
+    return Upload(data, source_name(source))
+
+
+class _InlinePool:
+    # Executor stand-in that runs each task on submit, in the calling process
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+_load_pool = None
+_load_pool_lock = threading.Lock()
+
+
+def load_pool():
+    # Started on first use and kept for the life of the process, so later runs do not pay for
+    # the worker start-up. Spawned rather than forked: Streamlit runs scripts in threads.
+    global _load_pool
+    if LOAD_WORKERS <= 1:
+        return _InlinePool()
+    with _load_pool_lock:
+        if _load_pool is None:
+            _load_pool = ProcessPoolExecutor(max_workers=LOAD_WORKERS, mp_context=get_context('spawn'))
+        return _load_pool
+
+
+def shutdown_load_pool():
+    # Stop the load pool's workers, e.g. before the process that started them exits; the next
+    # load starts a new pool
+    global _load_pool
+    with _load_pool_lock:
+        if _load_pool is not None:
+            _load_pool.shutdown()
+            _load_pool = None
+
+
+def _submit(pool, fn, *args):
+    if isinstance(pool, ProcessPoolExecutor):
+        args = [_portable(arg) if hasattr(arg, 'read') else arg for arg in args]
+    return pool.submit(fn, *args)
+
+
+def _parse_task(file, ext, sheet, columns, stop_marker):
+    try:
+        return _parse_file(file, ext, sheet, columns, stop_marker)
+    except Exception as e:
+        raise InputFileError(f"Error reading file {source_name(file)}: {str(e)}")
+
+
+def read_file_async(pool, file, sheet=None, columns=None, stop_marker=None):
+    # read_file() with the parse submitted to `pool`; returns a future of the frame
+    name = source_name(file)
+    ext = os.path.splitext(name)[1].lower()
+    future = Future()
+    if ext not in ['.xlsx', '.xls', '.csv']:
+        future.set_exception(InputFileError(f"Invalid file format for {name}. Please upload CSV or Excel files."))
+        return future
+    try:
+        if ext == '.csv':
+            sheet = stop_marker = None
+        key = (content_hash(file), sheet, tuple(columns or ()), stop_marker)
+        df = frame_cache.get(key)
+    except Exception as e:
+        future.set_exception(InputFileError(f"Error reading file {name}: {str(e)}"))
+        return future
+    if df is not None:
+        future.set_result(df)
+        return future
+
+    def cache(done):
+        if done.exception() is None:
+            frame_cache.put(key, done.result(), int(done.result().memory_usage(deep=True).sum()))
+
+    future = _submit(pool, _parse_task, file, ext, sheet, columns, stop_marker)
+    future.add_done_callback(cache)
+    return future
+
+
+def read_file(file, sheet=None, columns=None, stop_marker=None):
+    # Parsed frames are cached by content, so rereading an unchanged upload skips the parse
+    return read_file_async(_InlinePool(), file, sheet, columns, stop_marker).result()
+
+
+def check_frame(df, name):
+    if df is None:
+        raise InputFileError(f"Invalid file format for {name}. Please upload CSV or Excel files.")
+    if not isinstance(df, pd.DataFrame):
+        raise InputFileError(f"Error: {name} did not load as a DataFrame. Got type {type(df)}.")
+    if df.empty:
+        raise InputFileError(f"File {name} is empty.")
+    return df
+
+
+class RecordSheet:
+    # The 'Record' sheet of file2, opened read-only so that single blocks can be read without
+    # parsing the whole sheet. CSV uploads are read into a DataFrame as before.
+    def __init__(self, source):
+        self.source = source
+        self.wb = self.ws = self.frame = None
+        name = source_name(source)
+        ext = os.path.splitext(name)[1].lower()
+        if ext not in ['.xlsx', '.xls']:
+            self.frame = check_frame(read_file(source, sheet='Record'), 'file2')
+            return
+
+        try:
+            if hasattr(source, 'seek'):
+                source.seek(0)
+            self.wb = openpyxl.load_workbook(source, read_only=True, data_only=True, keep_links=False)
+        except Exception as e:
+            raise InputFileError(f"Error reading file {name}: {str(e)}")
+        if 'Record' not in self.wb.sheetnames:
+            self.close()
+            raise InputFileError(f"Error reading file {name}: Worksheet named 'Record' not found")
+        self.ws = self.wb['Record']
+        # Same as read_excel: trust the rows actually present, not the declared dimensions
+        self.ws.reset_dimensions()
+        if next(self.rows(2, 2), None) is None:
+            self.close()
+            raise InputFileError("File file2 is empty.")
+
+    def rows(self, first_row=2, last_row=None):
+        # (sheet row number, values) pairs; row 1 is the header read_excel would have consumed
+        if self.frame is not None:
+            return enumerate(self.frame.itertuples(index=False, name=None), start=2)
+        if first_row == 2 and last_row is None:
+            if excel_backend() == 'calamine':
+                rows = iter_sheet_values(self.source, 'Record', 'calamine')
+                next(rows, None)
+                return enumerate(rows, start=2)
+            return enumerate(self.ws.iter_rows(min_row=2, values_only=True), start=2)
+        return record_index.iter_rows_from(self.ws, first_row, last_row)
+
+    def close(self):
+        if self.wb is not None:
+            self.wb.close()
+
+
+def _integer_text(values):
+    # True if every value is an integer literal, i.e. read_csv would have made the column numeric
+    return values.str.fullmatch(r'\s*[+-]?\d+\s*').all()
+
+
+def _common_dtype(dtypes):
+    # dtype read_csv gives a column whose chunks were inferred as `dtypes`, or None if a
+    # chunk held text and the column would have been read as strings throughout
+    if any(not pd.api.types.is_numeric_dtype(dtype) for dtype in dtypes):
+        return None
+    return np.result_type(*dtypes)
+
+
+def read_mtm_csv(file, non_null_ids, dates, chunksize=None):
+    # Stream a Compiled MTM CSV in chunks, keeping only the rows of the file3 users on `dates`,
+    # so memory is bounded by the chunk size rather than by the whole history. Returns None
+    # when the file has to be read whole to match it the way read_csv would (numeric UserIDs,
+    # text in a value column, missing columns).
+    name = source_name(file)
+    target_dates = [_target_date(date) for date in dates]
+    ids = {value for value in non_null_ids if isinstance(value, str)}
+    try:
+        if hasattr(file, 'seek'):
+            file.seek(0)
+        header = pd.read_csv(file, nrows=0).columns
+    except Exception as e:
+        raise InputFileError(f"Error reading file {name}: {str(e)}")
+    if 'UserID' not in header or 'Date' not in header:
+        return None
+    columns = [col for col in header if col in FILE1_COLUMNS]
+    values = [col for col in columns if col not in ('UserID', 'Date')]
+
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    chunks = []
+    dtypes = {col: [] for col in values}
+    total = 0
+    numeric_ids = None
+    date_format = None
+    try:
+        reader = pd.read_csv(file, usecols=columns, dtype={'UserID': str, 'Date': str},
+                             chunksize=chunksize or CSV_CHUNK_ROWS)
+        for chunk in reader:
+            total += len(chunk)
+            for col in values:
+                dtypes[col].append(chunk[col].dtype)
+            user = chunk['UserID'].dropna()
+            if numeric_ids is not False and not user.empty:
+                numeric_ids = _integer_text(user)
+            chunk = chunk[chunk['UserID'].isin(ids)]
+            if chunk.empty:
+                continue
+            if date_format is None:
+                first = chunk['Date'].dropna()
+                if not first.empty:
+                    date_format = guess_datetime_format(first.iloc[0]) or 'mixed'
+            try:
+                chunk['Date'] = pd.to_datetime(chunk['Date'], format=date_format)
+            except Exception as e:
+                raise SchemaError(f"Error converting Date column in file1: {str(e)}")
+            chunks.append(chunk[_calendar_day(chunk['Date']).isin(target_dates)])
+    except ProcessingError:
+        raise
+    except Exception as e:
+        raise InputFileError(f"Error reading file {name}: {str(e)}")
+
+    if total == 0:
+        raise InputFileError("File file1 is empty.")
+    if numeric_ids:
+        return None
+    common = {col: _common_dtype(dtypes[col]) for col in values}
+    if any(dtype is None for dtype in common.values()):
+        return None
+    df1 = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=columns)
+    return df1.astype({col: dtype for col, dtype in common.items()})
+
+
+def _store_digest(source):
+    if not mtm_store.available():
+        return None
+    try:
+        return content_hash(source)
+    except OSError:
+        return None
+
+
+def _mtm_history(future, digest):
+    df1 = check_frame(future.result(), 'file1')
+    if digest is not None:
+        # The store only saves later runs a parse; failing to write it never fails this one
+        try:
+            mtm_store.import_history(df1, digest)
+        except Exception:
+            pass
+    return df1
+
+
+def _store_partitions(digest, dates):
+    # Rows of `dates` from the columnar store, None if the history has not been imported
+    parts = [mtm_store.load_partition(digest, _target_date(date)) for date in dates]
+    if any(part is None for part in parts):
+        return None
+    # Empty days carry no dtypes, so leave them out unless every day is empty
+    found = [part for part in parts if not part.empty] or parts[:1]
+    return found[0] if len(found) == 1 else pd.concat(found, ignore_index=True)
+
+
+def start_mtm_history(pool, source, dates):
+    # Start loading file1 for `dates`; returns a function that waits for the frame. That is
+    # the days' partitions of the columnar store once the history has been imported, otherwise
+    # the whole workbook parsed in `pool` (and then imported). None for a CSV, which is
+    # streamed once the file3 IDs are known.
+    digest = _store_digest(source)
+    if digest is not None:
+        df1 = _store_partitions(digest, dates)
+        if df1 is not None:
+            return lambda: df1
+    if os.path.splitext(source_name(source))[1].lower() == '.csv':
+        return None
+    parse = read_file_async(pool, source, columns=FILE1_COLUMNS)
+    return lambda: _mtm_history(parse, digest)
+
+
+def load_mtm_history(source, dates, non_null_ids):
+    # file1 rows for `dates` and the file3 users: streamed in chunks for a CSV, the whole
+    # workbook otherwise
+    history = start_mtm_history(_InlinePool(), source, dates)
+    if history is not None:
+        return history()
+    df1 = read_mtm_csv(source, non_null_ids, dates)
+    if df1 is not None:
+        return df1
+    return _mtm_history(read_file_async(_InlinePool(), source, columns=FILE1_COLUMNS), _store_digest(source))
+
+
+def _allocation_task(source, dates):
+    # Errors opening file2 are raised at once. A (frame, error) pair is returned per date:
+    # errors in the blocks of a date are raised where the blocks used to be read, after
+    # file1 has been matched.
+    record = RecordSheet(source)
+    try:
+        if len(dates) == 1:
+            try:
+                return [(load_allocation_record(record, dates[0]), None)]
+            except Exception as e:
+                return [(None, e)]
+        return load_allocation_records(record, dates)
+    finally:
+        record.close()
+
+
+def load_inputs(mtm_source, allocation_source, daily_source, sheet_name, dates):
+    # The three uploads are parsed concurrently in worker processes, so the slowest one rather
+    # than their sum sets the latency. Errors are raised per file and in file order, as when
+    # they were read one after another. file1 is None for a CSV, see load_mtm_history(); file2
+    # comes as a (frame, error) pair per date, see _allocation_task().
+    pool = load_pool()
+    history = start_mtm_history(pool, mtm_source, dates)
+    allocation = _submit(pool, _allocation_task, allocation_source, list(dates))
+    daily = read_file_async(pool, daily_source, sheet=sheet_name, stop_marker=FILE3_LAST_MARKER)
+
+    df1 = history() if history is not None else None
+    allocation = allocation.result()
+    df3 = check_frame(daily.result(), 'file3')
+    return df1, allocation, df3
+
+
+def _probe_rows(source, sheet, name, problems):
+    # The probe of an .xlsx and the rows of `sheet` (the first sheet if None); a missing sheet is
+    # a problem and gives no rows
+    probe = sheet_probe.SheetProbe(source)
+    if sheet is None:
+        sheet = probe.sheet_names[0]
+    elif sheet not in probe.sheets:
+        problems.append(f"Error reading file {name}: Worksheet named '{sheet}' not found")
+        probe.close()
+        return None, None
+    return probe, probe.rows(sheet)
+
+
+def _has_values(probe, body):
+    return any(value is not None and value != '' for _, value in probe.cells(body))
+
+
+def _check_mtm(source, ext, name, problems):
+    # Header row of file1 and one row under it
+    if ext == '.csv':
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        frame = pd.read_csv(source, nrows=1)
+        header, empty = list(frame.columns), frame.empty
+    else:
+        probe, rows = _probe_rows(source, None, name, problems)
+        header, empty = [], True
+        try:
+            for number, body in rows:
+                if number == 1:
+                    header = [value for _, value in probe.cells(body) if value is not None]
+                elif _has_values(probe, body):
+                    empty = False
+                    break
+        finally:
+            probe.close()
+    if not header:
+        problems.append("File file1 is empty.")
+        return
+    for column in FILE1_COLUMNS:
+        if column not in header:
+            problems.append(f"Error: '{column}' column not found in file1.")
+    if empty:
+        problems.append("File file1 is empty.")
+
+
+def _check_allocation(source, ext, name, problems):
+    # The 'Record' sheet of file2 and a row under its header
+    if ext == '.csv':
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        if pd.read_csv(source, nrows=1).empty:
+            problems.append("File file2 is empty.")
+        return
+    probe, rows = _probe_rows(source, 'Record', name, problems)
+    if probe is None:
+        return
+    try:
+        if not any(number >= 2 for number, _ in rows):
+            problems.append("File file2 is empty.")
+    finally:
+        probe.close()
+
+
+def _daily_layout(source, ext, sheet_name, name, problems):
+    # Sheet row of the first occurrence of each file3 marker, up to the last one, and the
+    # header row under each; None if the sheet is missing or empty
+    if ext == '.csv':
+        return _csv_daily_layout(source, problems)
+
+    probe, rows = _probe_rows(source, sheet_name, name, problems)
+    if probe is None:
+        return None
+    positions, headers, below = {}, {}, {}
+    empty = True
+    try:
+        # Row 1 is df3's header and holds no marker
+        for number, body in rows:
+            if number == 1:
+                continue
+            if number in below:
+                headers[below.pop(number)] = {value for _, value in probe.cells(body)}
+            if empty and _has_values(probe, body):
+                empty = False
+            label = probe.first_text(body)
+            if label in FILE3_SECTIONS and label not in positions:
+                positions[label] = number
+                below[number + 1] = label
+                if label == FILE3_LAST_MARKER:
+                    break
+    finally:
+        probe.close()
+    if empty:
+        problems.append("File file3 is empty.")
+        return None
+    return positions, headers
+
+
+def _csv_records(source):
+    # Records of a CSV as lists of text, decoded as read_csv does by default
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, newline='', encoding='utf-8-sig') as f:
+            yield from csv.reader(f)
+        return
+    source.seek(0)
+    text = TextIOWrapper(source, encoding='utf-8-sig', newline='')
+    try:
+        yield from csv.reader(text)
+    finally:
+        # Leave the upload itself open
+        text.detach()
+
+
+def _csv_daily_layout(source, problems):
+    # _daily_layout() of a CSV file3, read record by record up to the last marker. Positions count
+    # the rows read_csv would make of the records: blank lines are skipped.
+    records = _csv_records(source)
+    positions, headers, below = {}, {}, {}
+    try:
+        header = next(records, None)
+        if header is None:
+            problems.append("File file3 is empty.")
+            return None
+        # Markers are looked for in "Unnamed: 0", the column read_csv names after a blank first
+        # header cell
+        labelled = header[0] in ('', 'Unnamed: 0')
+        position = -1
+        for record in records:
+            if len(record) <= 1 and not (record and record[0].strip()):
+                continue
+            position += 1
+            if not labelled:
+                break
+            if position in below:
+                headers[below.pop(position)] = set(record)
+            label = record[0]
+            if label in FILE3_SECTIONS and label not in positions:
+                positions[label] = position
+                below[position + 1] = label
+                if label == FILE3_LAST_MARKER:
+                    break
+    finally:
+        records.close()
+    if position < 0:
+        problems.append("File file3 is empty.")
+        return None
+    return positions, headers
+
+
+def _check_daily(source, ext, name, problems, sheet_name):
+    layout = _daily_layout(source, ext, sheet_name, name, problems)
+    if layout is None:
+        return
+    positions, headers = layout
+    missing = [label for label in FILE3_SECTIONS if label not in positions]
+    if missing:
+        problems.append(f"Error: Required sections ({', '.join(FILE3_SECTIONS)}) not found in file3. "
+                        f"Missing: {', '.join(missing)}.")
+    for label, following in zip(FILE3_SECTIONS, FILE3_SECTIONS[1:]):
+        if label in positions and following in positions and positions[following] <= positions[label]:
+            problems.append(f"Error: The {label} section must come before {following} in file3.")
+    for label in FILE3_SECTIONS[:-1]:
+        if label in positions and 'IDs' not in headers.get(label, ()):
+            problems.append(f"Error: 'IDs' column not found in {label} section of file3.")
+
+
+def preflight(mtm_source, allocation_source, daily_source, sheet_name):
+    # Checks made before anything is parsed, from the sheet names, the header rows and the first
+    # column of file3 read straight out of the workbooks: the file1 columns, the 'Record' sheet,
+    # the file3 sheet and its section markers. Raises PreflightError listing every problem found.
+    # .xls files are left to the full parse.
+    problems = []
+    for check, source, args in ((_check_mtm, mtm_source, ()), (_check_allocation, allocation_source, ()),
+                                (_check_daily, daily_source, (sheet_name,))):
+        name = source_name(source)
+        ext = os.path.splitext(name)[1].lower()
+        if ext not in ['.xlsx', '.xls', '.csv']:
+            problems.append(f"Invalid file format for {name}. Please upload CSV or Excel files.")
+            continue
+        if ext == '.xls':
+            continue
+        try:
+            check(source, ext, name, problems, *args)
+        except ProcessingError as e:
+            problems.append(str(e))
+        except Exception as e:
+            problems.append(f"Error reading file {name}: {str(e)}")
+    if problems:
+        raise PreflightError(problems)
+
+
+def locate_sections(df3, markers=FILE3_SECTIONS):
+    # Row position of the first occurrence of each marker, from one pass over the first column
+    labels = df3["Unnamed: 0"]
+    positions = {}
+    for position in np.flatnonzero(labels.isin(markers).to_numpy()):
+        positions.setdefault(labels.iat[position], position)
+    return positions
+
+
+def as_labels(column):
+    # An object column of text labels as a categorical: copies share one set of categories and
+    # the lookups and joins on it factorize integer codes instead of hashing every string again.
+    # Labels read as numbers stay objects, which expand_aliases() infers to numbers. Categories
+    # are kept in order of appearance; sorting them costs more than the lookups save.
+    if column.dtype != object:
+        return column
+    codes, categories = pd.factorize(column.to_numpy())
+    if pd.Index(categories).infer_objects().dtype != object:
+        return column
+    return pd.Series(pd.Categorical.from_codes(codes, dtype=pd.CategoricalDtype(categories)),
+                     index=column.index, name=column.name)
+
+
+def from_categories(df, columns=SECTION_LABELS):
+    return df.astype({col: object for col in columns if isinstance(df[col].dtype, pd.CategoricalDtype)})
+
+
+def map_labels(labels, values):
+    # labels.map(values), typed as it is for object labels: a categorical maps its categories and
+    # can come back as a categorical of the values, whose categories cannot hold the NaN of
+    # unmatched labels, so it goes through objects and is inferred again
+    mapped = labels.map(values)
+    if isinstance(mapped.dtype, pd.CategoricalDtype):
+        return pd.Series(mapped.to_numpy(dtype=object), index=mapped.index, name=mapped.name).infer_objects()
+    return mapped
+
+
+def type_section(df):
+    # Figures and day columns get their own dtypes (float64 mostly) instead of sharing df3's
+    # object block; the IDs and Alias labels become categoricals. In place; most of the cost of
+    # split_sections().
+    for n, name in enumerate(df.columns):
+        if df.dtypes.iloc[n] == object:
+            column = df.iloc[:, n]
+            df.isetitem(n, as_labels(column) if name in SECTION_LABELS else column.infer_objects())
+    return df
+
+
+def extract_section(df3, start, end, label):
+    # The rows between the header row (just below the marker at start) and the next marker at end,
+    # headed by the header row, typed by type_section(). A shallow copy: new columns stay its own.
+    df = df3.iloc[start + 2:end].copy(deep=False)
+    df.columns = df3.iloc[start + 1]
+    df.index = pd.RangeIndex(len(df))
+    if 'IDs' not in df.columns:
+        raise SchemaError(f"Error: 'IDs' column not found in {label} section of file3.")
+    return type_section(df)
+
+
+def split_sections(df3, markers=FILE3_SECTIONS):
+    # One frame per section, in marker order; the last marker only closes the section before it
+    positions = locate_sections(df3, markers)
+    if len(positions) < len(markers):
+        raise SchemaError(f"Error: Required sections ({', '.join(markers)}) not found in file3.")
+    sections = []
+    for label, following in zip(markers, markers[1:]):
+        if positions[following] <= positions[label]:
+            raise SchemaError(f"Error: The {label} section must come before {following} in file3.")
+        sections.append(extract_section(df3, positions[label], positions[following], label))
+    return tuple(sections)
+
+
+def _calendar_day(dates):
+    # Midnight of each datetime's own calendar day, like .dt.date but kept as datetime64
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+    return dates.dt.normalize()
+
+
+def user_rows(df1, non_null_ids):
+    # file1 rows of the file3 users, with Date parsed and UserID as labels (see as_labels())
+    if 'UserID' not in df1.columns:
+        raise SchemaError("Error: 'UserID' column not found in file1.")
+    df_new = df1[df1["UserID"].isin(non_null_ids)]
+    try:
+        df_new['Date'] = pd.to_datetime(df_new['Date'])
+    except Exception as e:
+        raise SchemaError(f"Error converting Date column in file1: {str(e)}")
+    df_new['UserID'] = as_labels(df_new['UserID'])
+    return df_new
+
+
+def match_date_rows(df1, non_null_ids, date):
+    df_new = user_rows(df1, non_null_ids)
+    try:
+        match_date = pd.to_datetime(date)
+    except Exception:
+        raise ProcessingError(f"Invalid date format: {date}. Please use YYYY-MM-DD.")
+    matched_rows = df_new[df_new['Date'].dt.date == match_date.date()]
+    if matched_rows.empty:
+        raise NoDataError(f"No data found for date {date} in file1.")
+
+    return matched_rows.drop(columns=[col for col in FILE1_DROP_COLUMNS if col in matched_rows.columns])
+
+
+def map_file1_values(mtm_df, capital_deployed_df, max_loss_df, matched_rows):
+    if 'MTM (All)' not in matched_rows.columns:
+        raise SchemaError("Error: 'MTM (All)' column not found in file1.")
+    mtm_df['mtm'] = map_labels(mtm_df['IDs'], matched_rows.set_index('UserID')['MTM (All)'])
+    if 'ALLOCATION' not in matched_rows.columns:
+        raise SchemaError("Error: 'ALLOCATION' column not found in file1.")
+    capital_deployed_df['Allocation'] = (map_labels(capital_deployed_df['IDs'], matched_rows.set_index('UserID')['ALLOCATION']) * 100)
+    if 'MAX LOSS' not in matched_rows.columns:
+        raise SchemaError("Error: 'MAX LOSS' column not found in file1.")
+    max_loss_df['max_loss'] = map_labels(max_loss_df['IDs'], matched_rows.set_index('UserID')['MAX LOSS'])
+    return mtm_df, capital_deployed_df, max_loss_df
+
+
+def _spread(column, block):
+    # The column with block - 1 missing values after each value, typed as infer_objects() would
+    # type it; numeric columns stay numeric arrays instead of going through Python objects, and
+    # categoricals spread their codes
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes = np.full(len(column) * block, -1, dtype=column.cat.codes.dtype)
+        codes[::block] = column.cat.codes.to_numpy()
+        return pd.Categorical.from_codes(codes, dtype=column.dtype)
+    if len(column) and column.dtype.kind in 'iuf':
+        values = np.full(len(column) * block, np.nan)
+        values[::block] = column.to_numpy()
+        return values
+    values = np.full(len(column) * block, np.nan, dtype=object)
+    values[::block] = column.to_numpy(dtype=object)
+    return pd.Series(values).infer_objects()
+
+
+def expand_aliases(df):
+    # Insert one empty row per component under every user row
+    block = len(ALIAS_VALUES) + 1
+    # A header repeated in the section is one column holding the values of its last occurrence,
+    # as it was when each row went through a dict
+    last = {label: n for n, label in enumerate(df.columns)}
+    columns = list(last)
+    df = pd.DataFrame({i: _spread(df.iloc[:, n], block) for i, n in enumerate(last.values())},
+                      index=pd.RangeIndex(len(df) * block))
+    df.columns = columns
+    aliases = np.tile(np.array([np.nan] + ALIAS_VALUES, dtype=object), len(df) // block)
+    alias = df['Alias']
+    if isinstance(alias.dtype, pd.CategoricalDtype):
+        alias = alias.cat.add_categories([value for value in ALIAS_VALUES if value not in alias.cat.categories])
+    df['Alias'] = alias.fillna(pd.Series(aliases, index=df.index))
+    return df
+
+
+def _cell_value(value):
+    # Same conversion read_excel applies: blanks and NA strings -> NaN, whole floats -> int
+    if value is None or (isinstance(value, str) and value in STR_NA_VALUES):
+        return np.nan
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _is_blank(row):
+    return all(pd.isna(_cell_value(value)) for value in row)
+
+
+def _is_header(row):
+    return any(isinstance(value, str) and 'userid' in value.lower() for value in row)
+
+
+def _block_date(row):
+    # First value of the row above a header that parses as a date from 2020 on
+    for val in row:
+        try:
+            dt = pd.to_datetime(_cell_value(val), dayfirst=True, errors='raise')
+            if dt.year >= 2020:
+                return dt
+        except Exception:
+            continue
+    return pd.NaT
+
+
+def _block_row(row):
+    values = [_cell_value(value) for value in row]
+    width = len(FILE2_HEADER)
+    if any(pd.notna(value) for value in values[width:]):
+        raise ValueError(f"{width} columns passed, passed data had {len(values)} columns")
+    return values[:width] + [np.nan] * (width - len(values))
+
+
+def _target_date(date):
+    try:
+        return pd.to_datetime(date).normalize()
+    except Exception:
+        raise ProcessingError(f"Invalid date format: {date}. Please use YYYY-MM-DD.")
+
+
+def scan_record(rows, target_date):
+    # Single pass over numbered Record rows. Returns every UserID block as
+    # (block date, header row, last row) and the data rows of the blocks dated target_date.
+    blocks, data_rows = scan_record_dates(rows, [target_date])
+    return blocks, data_rows.get(target_date, [])
+
+
+def scan_record_dates(rows, target_dates):
+    # scan_record() for several dates: the data rows come as {date: rows}
+    rows = iter(rows)
+    target_dates = set(target_dates)
+    blocks = []
+    data_rows = {}
+    previous = None
+    number, row = next(rows, (None, None))
+    while row is not None:
+        at = number
+        try:
+            if _is_header(row):
+                header_row = last_row = number
+                block_date = _block_date(previous) if previous is not None else pd.NaT
+                keep = data_rows.setdefault(block_date, []) if block_date in target_dates else None
+                previous, (number, row) = row, next(rows, (None, None))
+                while row is not None and not _is_blank(row) and not _is_header(row):
+                    if keep is not None:
+                        keep.append(_block_row(row))
+                    last_row = number
+                    previous, (number, row) = row, next(rows, (None, None))
+                blocks.append((block_date, header_row, last_row))
+            else:
+                previous, (number, row) = row, next(rows, (None, None))
+        except Exception as e:
+            raise ProcessingError(f"Error processing file2 at row {at - 2}: {str(e)}")
+    return blocks, data_rows
+
+
+def record_frame(blocks, data_rows, target_date):
+    if not blocks:
+        raise SchemaError("Error: 'UserID' column not found in file2 (Jainam Daily Allocation). Please ensure the 'Record' sheet contains a 'UserID' header.")
+    if not any(last_row > header_row for _, header_row, last_row in blocks):
+        raise NoDataError("Error: No valid data blocks found in file2.")
+    if not data_rows:
+        raise NoDataError(f"No data found for {target_date.date()} in file2.")
+    df2 = pd.DataFrame(data_rows, columns=FILE2_HEADER)
+    df2["Date"] = target_date
+    df2 = df2.drop(columns=['Algo', 'MAX LOSS'])
+    return df2.iloc[:-1].reset_index(drop=True)
+
+
+def parse_allocation_record(rows, date):
+    target_date = _target_date(date)
+    blocks, data_rows = scan_record(rows, target_date)
+    return record_frame(blocks, data_rows, target_date)
+
+
+def _read_blocks(record, blocks, target_dates):
+    # Read only the indexed blocks dated one of target_dates, as {date: rows}; None if the
+    # sheet no longer matches the index
+    target_dates = set(target_dates)
+    data_rows = {}
+    for block in blocks:
+        block_date, header_row, last_row = block
+        if block_date not in target_dates:
+            continue
+        found, rows = scan_record_dates(record.rows(header_row - 1, last_row), [block_date])
+        if found != [block]:
+            return None
+        data_rows.setdefault(block_date, []).extend(rows.get(block_date, []))
+    return data_rows
+
+
+def _index_entry(record, blocks):
+    # The checkpoint sits right after the last header, so that header and everything above it
+    # are covered by the digest and the last block can still grow
+    checkpoint = None
+    if blocks:
+        row = blocks[-1][1] + 1
+        digest = record_index.prefix_digest(record.ws, row)
+        if digest is not None:
+            checkpoint = {'row': row, 'digest': digest}
+    return {
+        'blocks': [[None if pd.isna(d) else d.isoformat(), header_row, last_row] for d, header_row, last_row in blocks],
+        'checkpoint': checkpoint,
+    }
+
+
+def _index_blocks(entry):
+    return [(pd.Timestamp(d) if d is not None else pd.NaT, header_row, last_row) for d, header_row, last_row in entry['blocks']]
+
+
+def _scan_appended(record, target_date):
+    # Reuse the index of an earlier version of this workbook if rows were only appended since
+    digests = {}
+    for digest in record_index.recent_indexes()[:8]:
+        entry = record_index.load_index(digest)
+        checkpoint = entry and entry.get('checkpoint')
+        if not checkpoint:
+            continue
+        row = checkpoint['row']
+        if row not in digests:
+            digests[row] = record_index.prefix_digest(record.ws, row)
+        if digests[row] != checkpoint['digest']:
+            continue
+
+        last_header = row - 1
+        kept = [block for block in _index_blocks(entry) if block[1] < last_header]
+        data_rows = _read_blocks(record, kept, [target_date])
+        if data_rows is None:
+            continue
+        found, new_rows = scan_record(record.rows(last_header - 1), target_date)
+        return kept + [block for block in found if block[1] >= last_header], data_rows.get(target_date, []) + new_rows
+    return None
+
+
+def load_allocation_record(record, date):
+    # file2 for one date, read through the per-date block index when the workbook has been seen before
+    target_date = _target_date(date)
+    if record.ws is None:
+        blocks, data_rows = scan_record(record.rows(), target_date)
+        return record_frame(blocks, data_rows, target_date)
+
+    digest = content_hash(record.source)
+    entry = record_index.load_index(digest)
+    if entry is not None:
+        blocks = _index_blocks(entry)
+        data_rows = _read_blocks(record, blocks, [target_date])
+        if data_rows is not None:
+            return record_frame(blocks, data_rows.get(target_date, []), target_date)
+
+    scanned = _scan_appended(record, target_date)
+    if scanned is None:
+        scanned = scan_record(record.rows(), target_date)
+    blocks, data_rows = scanned
+    record_index.save_index(digest, _index_entry(record, blocks))
+    return record_frame(blocks, data_rows, target_date)
+
+
+def load_allocation_records(record, dates):
+    # load_allocation_record() for several dates from one read of the Record sheet: a
+    # (frame, error) pair per date
+    target_dates = [_target_date(date) for date in dates]
+    blocks = data_rows = None
+    digest = None
+    if record.ws is not None:
+        digest = content_hash(record.source)
+        entry = record_index.load_index(digest)
+        if entry is not None:
+            blocks = _index_blocks(entry)
+            data_rows = _read_blocks(record, blocks, target_dates)
+    if data_rows is None:
+        try:
+            blocks, data_rows = scan_record_dates(record.rows(), target_dates)
+        except Exception as e:
+            return [(None, e)] * len(dates)
+        if digest is not None:
+            record_index.save_index(digest, _index_entry(record, blocks))
+
+    results = []
+    for target_date in target_dates:
+        try:
+            results.append((record_frame(blocks, data_rows.get(target_date, []), target_date), None))
+        except Exception as e:
+            results.append((None, e))
+    return results
+
+
+def fill_component_allocations(capital_deployed_df, df2, by=None):
+    # Component rows belong to the nearest user row above them. With `by`, the rows of several
+    # dates are stacked: `by` holds the date of each row, matched against df2's Date column.
+    if by is None:
+        owner = capital_deployed_df['IDs'].ffill()
+        key_columns = ['UserID']
+    else:
+        owner = capital_deployed_df['IDs'].groupby(by).ffill()
+        key_columns = ['Date', 'UserID']
+    is_component = (capital_deployed_df['IDs'].isna() & owner.notna() & owner.astype(bool)
+                    & capital_deployed_df['Alias'].isin(ALIAS_VALUES))
+
+    # (UserID, component) -> allocation in crores, taken from the first file2 row of each user
+    lookup = (df2.drop_duplicates(subset=key_columns, keep='first')
+              .melt(id_vars=key_columns, value_vars=ALIAS_VALUES, var_name='Alias', value_name='value')
+              .set_index(key_columns + ['Alias'])['value'])
+
+    arrays = [owner[is_component], capital_deployed_df.loc[is_component, 'Alias']]
+    if by is not None:
+        arrays.insert(0, by[is_component])
+    keys = pd.MultiIndex.from_arrays(arrays)
+    found = keys.isin(lookup.index)
+    rows = capital_deployed_df.index[is_component][found]
+    capital_deployed_df.loc[rows, 'Allocation'] = lookup.reindex(keys[found]).to_numpy() * 10_000_000
+
+    # The unnamed column holds the sheet's own figure for users missing from file1
+    try:
+        nan_column_name = capital_deployed_df.columns[capital_deployed_df.columns.isna()][0]
+    except IndexError:
+        raise SchemaError("Error: No unnamed column found in capital_deployed_df.")
+    capital_deployed_df['Allocation'] = capital_deployed_df['Allocation'].fillna(capital_deployed_df[nan_column_name])
+    return capital_deployed_df.drop(columns=[nan_column_name])
+
+
+def split_mtm(df, by=None):
+    # Spread each user's MTM over its components in proportion to allocation; `by` as in
+    # fill_component_allocations()
+    df = df.copy()
+    is_user = df['IDs'].notna()
+    # Every user row opens a group; rows above the first user belong to none (0)
+    group = is_user.cumsum() if by is None else is_user.groupby(by).cumsum()
+    keys = group if by is None else [by, group]
+    allocation = df['Allocation'].where(~is_user)
+    total_allocation = allocation.groupby(keys).transform('sum')
+    main_mtm = df['MTM'].where(is_user).groupby(keys).transform('first')
+
+    target = (~is_user & (group > 0) & allocation.notna()
+              & (total_allocation > 0) & main_mtm.notna())
+    proportion = allocation[target] / total_allocation[target]
+    # Section columns read from a CSV file3 can hold objects, which round() leaves as they are
+    df.loc[target, 'MTM'] = pd.to_numeric(main_mtm[target] * proportion).round(2)
+    return df
+
+
+def assemble_output(capital_deployed_df, max_loss_df):
+    # The labels go back to objects, as the outputs have always carried them
+    capital_deployed_df = from_categories(capital_deployed_df)
+    max_loss_df = from_categories(max_loss_df)
+    capital_deployed_df["  "] = "|"
+    capital_deployed_df["IDs(1)"] = max_loss_df["IDs"]
+    capital_deployed_df["Alias(1)"] = max_loss_df["Alias"]
+    capital_deployed_df["max_loss"] = max_loss_df["max_loss"]
+
+    # Rename columns for better readability
+    return capital_deployed_df.rename(columns={
+        'IDs': 'User ID',
+        'Alias': 'Component',
+        'Allocation': 'Capital Deployed',
+        'MTM': 'MTM',
+        '  ': '|',
+        'IDs(1)': 'User ID (SL)',
+        'Alias(1)': 'Component (SL)',
+        'max_loss': 'Max Loss'
+    })
+
+
+def _loaded_rows(df1, allocations, df3):
+    return (0 if df1 is None else len(df1)) + sum(len(df2) for df2, _ in allocations if df2 is not None) + len(df3)
+
+
+# Errors that follow from the inputs alone, so a cached one is raised again without a rerun.
+# Not InputFileError: its message names the uploaded file, which the cache key leaves out.
+CACHED_ERRORS = {error.__name__: error for error in (ProcessingError, SchemaError, NoDataError)}
+
+
+def cached_results(sources, sheet_name, dates):
+    # Result cache key of each date, None where there is none (cache off, input unreadable,
+    # bad date), the outputs already in the cache and the errors it recorded
+    keys = dict.fromkeys(dates)
+    digests = result_cache.input_digests(sources) if result_cache.available() else None
+    if digests is not None:
+        for date in dates:
+            try:
+                keys[date] = result_cache.result_key(digests, sheet_name, _target_date(date).date())
+            except ProcessingError:
+                pass
+    cached, errors = {}, {}
+    for date, key in keys.items():
+        output = result_cache.load_result(key)
+        if output is not None:
+            cached[date] = output
+            continue
+        error = result_cache.load_error(key)
+        if error is not None and error[0] in CACHED_ERRORS:
+            errors[date] = CACHED_ERRORS[error[0]](error[1])
+    return keys, cached, errors
+
+
+def cache_error(key, error):
+    if type(error) in CACHED_ERRORS.values():
+        result_cache.save_error(key, type(error).__name__, str(error))
+
+
+def record_outputs(outputs, keys, profile):
+    # Add the outputs to the month-to-date ledger; dates it already holds from the same inputs
+    # (the same result cache key) are skipped
+    days = {date: _target_date(date).date() for date in outputs}
+    written = ledger.record({days[date]: output for date, output in outputs.items()},
+                            {days[date]: keys.get(date) for date in outputs})
+    if written:
+        profile.lap("Record in ledger", sum(len(outputs[date]) for date in outputs
+                                            if days[date] in written))
+
+
+def process(mtm_source, allocation_source, daily_source, sheet_name, date, progress=None, profile=None):
+    # Run the full reconciliation for one date; raises ProcessingError subclasses.
+    # profile: a profiling.RunProfile to record the stages in
+    report = progress or (lambda value: None)
+    profile = profile or NO_PROFILE
+
+    report(10)
+    keys, cached, errors = cached_results([mtm_source, allocation_source, daily_source], sheet_name, [date])
+    if date in errors:
+        profile.lap("Load cached result")
+        raise errors[date]
+    if date in cached:
+        profile.lap("Load cached result", len(cached[date]))
+        record_outputs({date: cached[date]}, keys, profile)
+        report(100)
+        return cached[date]
+
+    try:
+        preflight(mtm_source, allocation_source, daily_source, sheet_name)
+        profile.lap("Preflight")
+        output = _process(mtm_source, allocation_source, daily_source, sheet_name, date, report, profile)
+    except ProcessingError as e:
+        cache_error(keys[date], e)
+        raise
+    if result_cache.save_result(keys[date], output):
+        profile.lap("Cache result", len(output))
+    record_outputs({date: output}, keys, profile)
+
+    report(100)
+    return output
+
+
+def _process(mtm_source, allocation_source, daily_source, sheet_name, date, report, profile):
+    report(20)
+    df1, allocations, df3 = load_inputs(mtm_source, allocation_source, daily_source, sheet_name, [date])
+    profile.lap("Load files", _loaded_rows(df1, allocations, df3))
+
+    report(30)
+    sections = split_sections(df3)
+    profile.lap("Split sections", sum(len(section) for section in sections))
+
+    report(50)
+    non_null_ids = sections[0]['IDs'].dropna().tolist()
+    if df1 is None:
+        df1 = load_mtm_history(mtm_source, [date], non_null_ids)
+        profile.lap("Load Compiled MTM history", len(df1))
+    return reconcile(df1, allocations[0], sections, non_null_ids, date, report, profile)
+
+
+def reconcile(df1, allocation, sections, non_null_ids, date, report, profile=NO_PROFILE):
+    # The per-date part of process(), from the file1 match to the assembled output
+    mtm_df, capital_deployed_df, max_loss_df = sections
+    matched_rows = match_date_rows(df1, non_null_ids, date)
+    profile.lap("Match file1 rows", len(matched_rows))
+
+    report(60)
+    mtm_df, capital_deployed_df, max_loss_df = map_file1_values(mtm_df, capital_deployed_df, max_loss_df, matched_rows)
+    profile.lap("Map file1 values", len(capital_deployed_df))
+
+    report(70)
+    # Filter out invalid rows
+    mtm_df = mtm_df[mtm_df['IDs'].notna() & (mtm_df['IDs'] != '')]
+    capital_deployed_df = capital_deployed_df[capital_deployed_df['IDs'].notna() & (capital_deployed_df['IDs'] != '')]
+    mtm_df = expand_aliases(mtm_df)
+    capital_deployed_df = expand_aliases(capital_deployed_df)
+    profile.lap("Filter and expand aliases", len(capital_deployed_df))
+
+    report(80)
+    df2, error = allocation
+    if error is not None:
+        raise error
+
+    report(90)
+    capital_deployed_df = fill_component_allocations(capital_deployed_df, df2)
+    profile.lap("Fill component allocations", len(capital_deployed_df))
+
+    # Map MTM to capital_deployed_df
+    mtm_df = mtm_df[["IDs", "Alias", "mtm"]]
+    unique_mtm_df = mtm_df.drop_duplicates(subset='IDs', keep='first')
+    capital_deployed_df['MTM'] = map_labels(capital_deployed_df['IDs'], unique_mtm_df.set_index('IDs')['mtm'])
+
+    capital_deployed_df = split_mtm(capital_deployed_df)
+    profile.lap("Split MTM", len(capital_deployed_df))
+    output = assemble_output(capital_deployed_df, max_loss_df)
+    profile.lap("Assemble output", len(output))
+    return output
+
+
+def _reconcile_stacked(rows, allocations, df3, dates):
+    # reconcile() for several dates at once: the file3 layout is filtered and expanded once,
+    # stacked once per date, and the per-date values go in through (date, UserID) lookups
+    # and grouped fills and splits. rows: file1 rows of the dates, from user_rows().
+    mtm_df, capital_deployed_df, max_loss_df = split_sections(df3)
+    mtm_df = mtm_df[mtm_df['IDs'].notna() & (mtm_df['IDs'] != '')]
+    capital_deployed_df = capital_deployed_df[capital_deployed_df['IDs'].notna() & (capital_deployed_df['IDs'] != '')]
+    mtm_ids = expand_aliases(mtm_df)[["IDs", "Alias"]]['IDs'].dropna()
+    layout = expand_aliases(capital_deployed_df)
+
+    days = [_target_date(date) for date in dates]
+    size = len(layout)
+    stacked = pd.concat([layout] * len(days), ignore_index=True)
+    by = pd.Series(np.repeat(np.array(days, dtype='datetime64[ns]'), size), index=stacked.index)
+    file1 = rows.set_index([_calendar_day(rows['Date']), 'UserID'])
+    keys = pd.MultiIndex.from_arrays([by, stacked['IDs']])
+
+    stacked['Allocation'] = file1['ALLOCATION'].reindex(keys).to_numpy() * 100
+    df2 = pd.concat([df2 for df2, _ in allocations], ignore_index=True)
+    stacked = fill_component_allocations(stacked, df2, by=by)
+    mtm = file1['MTM (All)'].reindex(keys).to_numpy()
+    stacked['MTM'] = pd.Series(mtm, index=stacked.index).where(stacked['IDs'].isin(mtm_ids))
+    stacked = split_mtm(stacked, by=by)
+
+    outputs = {}
+    for n, (date, day) in enumerate(zip(dates, days)):
+        capital_deployed_df = stacked.iloc[n * size:(n + 1) * size].reset_index(drop=True)
+        max_loss_df = max_loss_df.drop(columns='max_loss', errors='ignore')
+        day_rows = rows[_calendar_day(rows['Date']) == day]
+        max_loss_df['max_loss'] = map_labels(max_loss_df['IDs'], day_rows.set_index('UserID')['MAX LOSS'])
+        outputs[date] = assemble_output(capital_deployed_df, max_loss_df)
+    return outputs
+
+
+def process_range(mtm_source, allocation_source, daily_source, sheet_name, dates, progress=None, profile=None):
+    # Reconcile several dates of one monthly sheet: each input is parsed once and the per-date
+    # work runs over all the dates together. Returns {date: output}, each identical to
+    # process() for that date, and {date: error} for the dates process() would fail on.
+    # Errors that would stop every date, such as an unreadable file, are raised.
+    report = progress or (lambda value: None)
+    profile = profile or NO_PROFILE
+    unique = {}
+    for date in dates:
+        unique.setdefault(_target_date(date), date)
+    dates = [unique[day] for day in sorted(unique)]
+
+    # Dates already in the result cache are not reconciled again
+    report(10)
+    keys, cached, cached_errors = cached_results([mtm_source, allocation_source, daily_source], sheet_name, dates)
+    if cached or cached_errors:
+        profile.lap("Load cached results", sum(len(output) for output in cached.values()))
+    requested, dates = dates, [date for date in dates if date not in cached and date not in cached_errors]
+    if not dates:
+        record_outputs(cached, keys, profile)
+        report(100)
+        return ({date: cached[date] for date in requested if date in cached},
+                {date: cached_errors[date] for date in requested if date in cached_errors})
+
+    preflight(mtm_source, allocation_source, daily_source, sheet_name)
+    profile.lap("Preflight")
+    df1, allocations, df3 = load_inputs(mtm_source, allocation_source, daily_source, sheet_name, dates)
+    profile.lap("Load files", _loaded_rows(df1, allocations, df3))
+
+    report(30)
+    sections = split_sections(df3)
+    profile.lap("Split sections", sum(len(section) for section in sections))
+    non_null_ids = sections[0]['IDs'].dropna().tolist()
+    if df1 is None:
+        df1 = load_mtm_history(mtm_source, dates, non_null_ids)
+        profile.lap("Load Compiled MTM history", len(df1))
+
+    report(50)
+    rows = user_rows(df1, non_null_ids)
+    days = _calendar_day(rows['Date'])
+    profile.lap("Match file1 rows", len(rows))
+
+    # Dates whose outcome does not depend on the stacked arithmetic are settled here, in the
+    # order reconcile() checks them; dates it cannot express run through reconcile() itself
+    outputs, errors = {}, {}
+    stacked, single = [], []
+    for date, allocation in zip(dates, allocations):
+        day_rows = rows[days == _target_date(date)]
+        missing = [col for col in ('MTM (All)', 'ALLOCATION', 'MAX LOSS') if col not in day_rows.columns]
+        if day_rows.empty:
+            errors[date] = NoDataError(f"No data found for date {date} in file1.")
+        elif day_rows['UserID'].duplicated().any():
+            single.append((date, allocation))
+        elif missing:
+            errors[date] = SchemaError(f"Error: '{missing[0]}' column not found in file1.")
+        elif allocation[1] is not None:
+            errors[date] = allocation[1]
+        else:
+            stacked.append((date, allocation))
+
+    report(60)
+    if stacked:
+        try:
+            outputs.update(_reconcile_stacked(rows[days.isin([_target_date(date) for date, _ in stacked])],
+                                              [allocation for _, allocation in stacked], df3,
+                                              [date for date, _ in stacked]))
+        except Exception:
+            single = stacked + single
+    profile.lap("Reconcile dates together", sum(len(output) for output in outputs.values()))
+
+    report(90)
+    for date, allocation in single:
+        try:
+            outputs[date] = reconcile(df1, allocation, split_sections(df3), non_null_ids, date, lambda value: None)
+        except Exception as e:
+            errors[date] = e
+    if single:
+        profile.lap("Reconcile remaining dates one by one",
+                    sum(len(outputs[date]) for date, _ in single if date in outputs))
+
+    saved = [date for date in outputs if result_cache.save_result(keys[date], outputs[date])]
+    for date, error in errors.items():
+        cache_error(keys[date], error)
+    if saved:
+        profile.lap("Cache results", sum(len(outputs[date]) for date in saved))
+
+    outputs.update(cached)
+    record_outputs(outputs, keys, profile)
+    report(100)
+    errors.update(cached_errors)
+    return ({date: outputs[date] for date in requested if date in outputs},
+            {date: errors[date] for date in requested if date in errors})
+
+
+def combine_outputs(outputs):
+    # The outputs of a date range as one frame, with the date of each row in a leading column
+    frames = []
+    for date, output in outputs.items():
+        output = output.copy()
+        output.insert(0, 'Date', _target_date(date).date())
+        frames.append(output)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+# Formats and header style pd.ExcelWriter gives its cells, so the streamed workbooks look the same
+EXCEL_DATE_FORMAT = 'YYYY-MM-DD'
+EXCEL_DATETIME_FORMAT = 'YYYY-MM-DD HH:MM:SS'
+EXCEL_HEADER_FONT = Font(bold=True)
+EXCEL_HEADER_BORDER = Border(*(Side(style='thin'),) * 4)
+EXCEL_HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='top')
+EXPORT_CHUNK_ROWS = 10_000
+
+
+def _excel_value(sheet, value):
+    # One cell as pd.ExcelWriter would write it: blanks for missing values, 'inf' for infinities
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, (float, np.floating)):
+        if np.isnan(value):
+            return None
+        if np.isinf(value):
+            return 'inf' if value > 0 else '-inf'
+        return float(value)
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, str):
+        return value
+    if isinstance(value, datetime.date):
+        if isinstance(value, pd.Timestamp):
+            value = value.to_pydatetime()
+        cell = WriteOnlyCell(sheet, value=value)
+        cell.number_format = EXCEL_DATETIME_FORMAT if isinstance(value, datetime.datetime) else EXCEL_DATE_FORMAT
+        return cell
+    return str(value)
+
+
+def _write_sheet(workbook, title, df):
+    sheet = workbook.create_sheet(title)
+    header = []
+    for column in df.columns:
+        cell = _excel_value(sheet, column)
+        if not isinstance(cell, Cell):
+            cell = WriteOnlyCell(sheet, value=cell)
+        cell.font = EXCEL_HEADER_FONT
+        cell.border = EXCEL_HEADER_BORDER
+        cell.alignment = EXCEL_HEADER_ALIGNMENT
+        header.append(cell)
+    sheet.append(header)
+    for row in df.itertuples(index=False, name=None):
+        sheet.append([_excel_value(sheet, value) for value in row])
+
+
+def _save_workbook(sheets):
+    # Rows stream straight into the zip instead of building a cell tree for the whole sheet
+    workbook = openpyxl.Workbook(write_only=True)
+    for title, df in sheets:
+        _write_sheet(workbook, title, df)
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def to_excel(df):
+    return _save_workbook([('Sheet1', df)])
+
+
+def to_excel_by_date(outputs):
+    # One sheet per date, named YYYY-MM-DD
+    return _save_workbook((_target_date(date).strftime('%Y-%m-%d'), output) for date, output in outputs.items())
+
+
+def iter_csv(df, chunk_rows=None):
+    # Encoded CSV in chunks of rows, for responses that stream the output instead of holding it whole
+    chunk_rows = chunk_rows or EXPORT_CHUNK_ROWS
+    # pandas picks a datetime column's format from the rows it is given, so fix it once for the whole column
+    dates = [column for column, dtype in df.dtypes.items() if pd.api.types.is_datetime64_any_dtype(dtype)]
+    if dates:
+        df = df.copy()
+        for column in dates:
+            df[column] = df[column].astype(str).where(df[column].notna(), '')
+    yield df.iloc[:0].to_csv(index=False).encode()
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows].to_csv(index=False, header=False).encode()
+
+
+def to_csv(df):
+    return b''.join(iter_csv(df))
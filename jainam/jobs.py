@@ -0,0 +1,418 @@
+import argparse
+import atexit
+import datetime
+import json
+import logging
+import os
+import pickle
+import shutil
+import signal
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from multiprocessing import get_context
+
+from cache import CACHE_DIR, content_hash
+from engine import ProcessingError, Upload, process, process_range, shutdown_load_pool, source_name, to_excel
+from profiling import RunProfile, log_profile
+
+# Local job queue, so long reconciliations run outside the page that submitted them:
+#   jobs.sqlite3                      one row per job: status, progress, stage, inputs, dates
+#   inputs/<digest>/<file name>       each input stored once per content hash
+#   results/<job id>.pkl              ({date: output}, {date: error message})
+JOBS_DIR = os.path.join(CACHE_DIR, 'jobs')
+JOB_WORKERS = int(os.environ.get('JAINAM_JOB_WORKERS', 1))
+JOB_RETENTION_DAYS = int(os.environ.get('JAINAM_JOB_RETENTION_DAYS', 7))
+POLL_INTERVAL = 0.5
+
+# Runs a job gets: a job whose worker dies mid-run (killed, out of memory) is requeued until then,
+# and failed after
+JOB_ATTEMPTS = 2
+
+# Stage reported for each progress value of process() and process_range()
+STAGES = [
+    (0, "Waiting for a worker"),
+    (10, "Reading files"),
+    (30, "Locating the daily sheet sections"),
+    (50, "Matching Compiled MTM rows"),
+    (60, "Mapping MTM values"),
+    (70, "Expanding aliases"),
+    (80, "Checking allocations"),
+    (90, "Splitting MTM across components"),
+    (100, "Saving the result"),
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    progress INTEGER NOT NULL,
+    stage TEXT NOT NULL,
+    sheet_name TEXT NOT NULL,
+    dates TEXT NOT NULL,
+    inputs TEXT NOT NULL,
+    error TEXT,
+    profile TEXT,
+    worker_pid INTEGER,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    submitted REAL NOT NULL,
+    started REAL,
+    finished REAL
+)
+"""
+
+_workers = []
+_workers_lock = threading.Lock()
+_workers_stopped_at_exit = False
+
+
+def _connect():
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(JOBS_DIR, 'jobs.sqlite3'), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(SCHEMA)
+    # Queues created before run profiles and attempts were recorded
+    columns = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+    if 'profile' not in columns:
+        conn.execute('ALTER TABLE jobs ADD COLUMN profile TEXT')
+    if 'attempts' not in columns:
+        conn.execute('ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0')
+    return conn
+
+
+def stage_of(progress):
+    return [label for value, label in STAGES if value <= progress][-1]
+
+
+def _store_input(source):
+    # Keep a copy of the input for the worker; uploads do not outlive the request that carried them
+    path = os.path.join(JOBS_DIR, 'inputs', content_hash(source), os.path.basename(source_name(source)))
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        if isinstance(source, (str, os.PathLike)):
+            shutil.copyfile(source, tmp)
+        elif hasattr(source, 'getvalue'):
+            with open(tmp, 'wb') as f:
+                f.write(source.getvalue())
+        else:
+            source.seek(0)
+            with open(tmp, 'wb') as f:
+                shutil.copyfileobj(source, f)
+            source.seek(0)
+        os.replace(tmp, path)
+    else:
+        # Reused: recent again, so _purge() leaves it until the job that uses it is queued
+        os.utime(os.path.dirname(path))
+    return path
+
+
+def submit(mtm_source, allocation_source, daily_source, sheet_name, dates):
+    # Queue one reconciliation of the dates and return its job ID
+    inputs = [_store_input(source) for source in (mtm_source, allocation_source, daily_source)]
+    job_id = uuid.uuid4().hex
+    conn = _connect()
+    try:
+        conn.execute(
+            'INSERT INTO jobs (id, status, progress, stage, sheet_name, dates, inputs, submitted) '
+            'VALUES (?, ?, 0, ?, ?, ?, ?, ?)',
+            (job_id, 'queued', stage_of(0), sheet_name,
+             json.dumps([date.strftime('%Y-%m-%d') for date in dates]), json.dumps(inputs), time.time()))
+        _purge(conn)
+    finally:
+        conn.close()
+    return job_id
+
+
+def status(job_id):
+    # {'id', 'status' (queued/running/done/failed), 'progress', 'stage', 'dates', 'error', ...} or None
+    conn = _connect()
+    try:
+        row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['dates'] = [datetime.date.fromisoformat(date) for date in json.loads(job['dates'])]
+        job['profile'] = json.loads(job['profile']) if job['profile'] else None
+        job['queue_position'] = conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND submitted <= ?", (job['submitted'],)
+        ).fetchone()[0] if job['status'] == 'queued' else 0
+        return job
+    finally:
+        conn.close()
+
+
+def result(job_id):
+    # ({date: output}, {date: error message}) of a finished job
+    with open(os.path.join(JOBS_DIR, 'results', f"{job_id}.pkl"), 'rb') as f:
+        return pickle.load(f)
+
+
+def wait(job_id, interval=POLL_INTERVAL):
+    job = status(job_id)
+    while job is not None and job['status'] in ('queued', 'running'):
+        time.sleep(interval)
+        job = status(job_id)
+    return job
+
+
+def error_message(e):
+    # As the app shows it: ProcessingError messages are meant for the user as they are
+    return str(e) if isinstance(e, ProcessingError) else f"Error processing files: {str(e)}"
+
+
+def _claim(conn):
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY submitted LIMIT 1").fetchone()
+        if row is not None:
+            conn.execute("UPDATE jobs SET status = 'running', worker_pid = ?, started = ?, stage = ?, "
+                         "attempts = attempts + 1 WHERE id = ?", (os.getpid(), time.time(), stage_of(10), row['id']))
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    return row
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _requeue_orphans(conn):
+    # Jobs whose worker died mid-run (server restart, killed process) go back to the queue, or
+    # fail once they have had JOB_ATTEMPTS runs, so a job that kills its worker is not run forever
+    for row in conn.execute("SELECT id, worker_pid, attempts FROM jobs WHERE status = 'running'").fetchall():
+        if row['worker_pid'] is not None and _alive(row['worker_pid']):
+            continue
+        if row['attempts'] >= JOB_ATTEMPTS:
+            conn.execute("UPDATE jobs SET status = 'failed', error = ?, worker_pid = NULL, finished = ? "
+                         "WHERE id = ? AND status = 'running'",
+                         ("Error processing files: the worker processing them stopped unexpectedly.",
+                          time.time(), row['id']))
+        else:
+            conn.execute("UPDATE jobs SET status = 'queued', progress = 0, stage = ?, worker_pid = NULL "
+                         "WHERE id = ? AND status = 'running'", (stage_of(0), row['id']))
+
+
+def _run(conn, job):
+    def report(value):
+        conn.execute('UPDATE jobs SET progress = ?, stage = ? WHERE id = ?', (value, stage_of(value), job['id']))
+
+    dates = [datetime.date.fromisoformat(date) for date in json.loads(job['dates'])]
+    profile = RunProfile()
+    try:
+        # Read back as uploads under their own names, so messages name the file the user sent.
+        # Inside the try: a stored input that has gone missing fails the job, not the worker.
+        sources = []
+        for path in json.loads(job['inputs']):
+            try:
+                with open(path, 'rb') as f:
+                    sources.append(Upload(f.read(), os.path.basename(path)))
+            except OSError:
+                raise ProcessingError(f"The uploaded file {os.path.basename(path)} of this job is no longer "
+                                      f"available. Please process the files again.")
+        mtm, allocation, daily = sources
+        if len(dates) == 1:
+            output = process(mtm, allocation, daily, job['sheet_name'], dates[0], report, profile)
+            outputs, errors = {dates[0]: output}, {}
+        else:
+            outputs, errors = process_range(mtm, allocation, daily, job['sheet_name'], dates, report, profile)
+            errors = {date: error_message(e) for date, e in errors.items()}
+            if not outputs:
+                raise ProcessingError(next(iter(errors.values())))
+    except Exception as e:
+        record = profile.record(job=job['id'], status='failed', sheet_name=job['sheet_name'], dates=dates)
+        log_profile(record)
+        conn.execute("UPDATE jobs SET status = 'failed', error = ?, profile = ?, finished = ? WHERE id = ?",
+                     (error_message(e), json.dumps(record, default=str), time.time(), job['id']))
+        return
+
+    os.makedirs(os.path.join(JOBS_DIR, 'results'), exist_ok=True)
+    path = os.path.join(JOBS_DIR, 'results', f"{job['id']}.pkl")
+    with open(f"{path}.tmp", 'wb') as f:
+        pickle.dump((outputs, errors), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(f"{path}.tmp", path)
+    profile.lap("Save result", sum(len(output) for output in outputs.values()))
+    record = profile.record(job=job['id'], status='done', sheet_name=job['sheet_name'], dates=dates)
+    log_profile(record)
+    conn.execute("UPDATE jobs SET status = 'done', progress = 100, stage = 'Done', profile = ?, finished = ? "
+                 "WHERE id = ?", (json.dumps(record, default=str), time.time(), job['id']))
+
+
+def work(stop_when_idle=False, parent=None):
+    # Worker loop: run queued jobs oldest first, one at a time. The worker keeps engine's load
+    # pool, so the three uploads of a job are parsed concurrently. parent: PID of the server
+    # process that started this worker; the worker stops when it is gone.
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    if parent is not None:
+        # Stopped by the server with SIGTERM: leave through the finally below
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    conn = _connect()
+    try:
+        _requeue_orphans(conn)
+        while parent is None or os.getppid() == parent:
+            job = _claim(conn)
+            if job is not None:
+                _run(conn, job)
+            elif stop_when_idle:
+                return
+            else:
+                time.sleep(POLL_INTERVAL)
+    finally:
+        conn.close()
+        # Its processes would otherwise keep this one from exiting
+        shutdown_load_pool()
+
+
+def _stop_workers():
+    with _workers_lock:
+        for worker in _workers:
+            worker.terminate()
+        for worker in _workers:
+            worker.join()
+
+
+def ensure_workers():
+    # Keep JOB_WORKERS worker processes running alongside this server process. They are not
+    # daemonic, since a daemonic process cannot start the load pool; instead they are stopped
+    # when this process exits and stop by themselves if it dies. Their unfinished jobs are
+    # requeued by the next worker.
+    global _workers_stopped_at_exit
+    with _workers_lock:
+        _workers[:] = [worker for worker in _workers if worker.is_alive()]
+        context = get_context('spawn')
+        while len(_workers) < JOB_WORKERS:
+            worker = context.Process(target=work, kwargs={'parent': os.getpid()})
+            worker.start()
+            _workers.append(worker)
+        if _workers and not _workers_stopped_at_exit:
+            # Registered after multiprocessing's own exit handler, so it runs first: that one
+            # would otherwise wait for the workers to finish
+            atexit.register(_stop_workers)
+            _workers_stopped_at_exit = True
+
+
+def _purge(conn):
+    # Forget finished jobs past the retention period, and inputs no remaining job refers to.
+    # Inputs are stored before their job is queued, so ones newer than the cutoff stay: another
+    # session's submit() may be about to queue them.
+    cutoff = time.time() - JOB_RETENTION_DAYS * 86400
+    for row in conn.execute("SELECT id FROM jobs WHERE status IN ('done', 'failed') AND finished < ?",
+                            (cutoff,)).fetchall():
+        try:
+            os.remove(os.path.join(JOBS_DIR, 'results', f"{row['id']}.pkl"))
+        except OSError:
+            pass
+        conn.execute('DELETE FROM jobs WHERE id = ?', (row['id'],))
+
+    referenced = set()
+    for row in conn.execute('SELECT inputs FROM jobs').fetchall():
+        referenced.update(os.path.dirname(path) for path in json.loads(row['inputs']))
+    inputs_dir = os.path.join(JOBS_DIR, 'inputs')
+    for digest in os.listdir(inputs_dir):
+        path = os.path.join(inputs_dir, digest)
+        if path in referenced:
+            continue
+        try:
+            if os.path.getmtime(path) >= cutoff:
+                continue
+        except OSError:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def main(argv=None):
+    from cli import build_jobs, parse_date
+
+    parser = argparse.ArgumentParser(description="Queue Jainam reconciliations and run the queue's workers.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    worker_parser = commands.add_parser('worker', help="Run queued jobs until interrupted")
+    worker_parser.add_argument('--workers', type=int, default=JOB_WORKERS, help="Number of worker processes")
+    worker_parser.add_argument('--until-idle', action='store_true', help="Exit once the queue is empty")
+
+    submit_parser = commands.add_parser('submit', help="Queue dates for reconciliation")
+    submit_parser.add_argument('--mtm', required=True, help="Compiled MTM Sheet (xlsx/csv)")
+    submit_parser.add_argument('--allocation', required=True, help="Jainam Daily Allocation workbook")
+    submit_parser.add_argument('--daily', required=True,
+                               help="Updated JAINAM DAILY workbook, or a directory of monthly workbooks")
+    submit_parser.add_argument('--sheet', help="Sheet name in the daily workbook (default: month of each date)")
+    submit_parser.add_argument('--dates', nargs='+', type=parse_date, help="Dates to process (YYYY-MM-DD)")
+    submit_parser.add_argument('--start', type=parse_date, help="First date of a range (inclusive)")
+    submit_parser.add_argument('--end', type=parse_date, help="Last date of a range (inclusive)")
+    submit_parser.add_argument('--single-pass', action='store_true',
+                               help="One job per monthly sheet instead of one per date")
+
+    status_parser = commands.add_parser('status', help="Show the state of jobs")
+    status_parser.add_argument('ids', nargs='*', help="Job IDs (default: the most recent jobs)")
+
+    fetch = commands.add_parser('fetch', help="Write the outputs of a finished job")
+    fetch.add_argument('id', help="Job ID")
+    fetch.add_argument('--out-dir', default='.', help="Directory for the jainam_<date>.xlsx outputs")
+    args = parser.parse_args(argv)
+
+    if args.command == 'worker':
+        if args.workers <= 1:
+            work(args.until_idle)
+            return 0
+        context = get_context('spawn')
+        workers = [context.Process(target=work, args=(args.until_idle,)) for _ in range(args.workers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return 0
+
+    if args.command == 'submit':
+        groups = {}
+        for date, daily, sheet_name in build_jobs(args):
+            key = (daily, sheet_name) if args.single_pass else (daily, sheet_name, date)
+            groups.setdefault(key, []).append(date)
+        for (daily, sheet_name, *_), dates in groups.items():
+            print(f"{submit(args.mtm, args.allocation, daily, sheet_name, dates)} {' '.join(map(str, dates))}")
+        return 0
+
+    if args.command == 'status':
+        ids = args.ids
+        if not ids:
+            conn = _connect()
+            try:
+                ids = [row['id'] for row in conn.execute('SELECT id FROM jobs ORDER BY submitted DESC LIMIT 20')]
+            finally:
+                conn.close()
+        for job_id in ids:
+            job = status(job_id)
+            if job is None:
+                print(f"{job_id}: not found", file=sys.stderr)
+                continue
+            detail = job['error'] if job['status'] == 'failed' else f"{job['progress']}% {job['stage']}"
+            print(f"{job_id} {job['status']:>7} {' '.join(map(str, job['dates']))}: {detail}")
+        return 0
+
+    job = status(args.id)
+    if job is None or job['status'] != 'done':
+        raise SystemExit(f"{args.id}: {'not found' if job is None else job['status']}")
+    outputs, errors = result(args.id)
+    os.makedirs(args.out_dir, exist_ok=True)
+    for date, output in outputs.items():
+        path = os.path.join(args.out_dir, f"jainam_{date.strftime('%Y-%m-%d')}.xlsx")
+        with open(path, 'wb') as f:
+            f.write(to_excel(output))
+        print(f"{date}: wrote {path}")
+    for date, message in errors.items():
+        print(f"{date}: {message}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,280 @@
+import argparse
+import contextlib
+import datetime
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from cache import CACHE_DIR
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import pyarrow
+    import pyarrow.feather
+except ImportError:
+    pyarrow = None
+
+# Month-to-date ledger of the reconciled outputs, one directory per month. Each processed date is
+# a Feather partition of one row per user and component, and the month's aggregates sit next to it:
+#   2025-07/manifest.json                {"dates": {"2025-07-01": "<digest>", ...}, "sources": {...},
+#                                         "summary": "summary.<digest>.feather", "daily": ...}
+#   2025-07/2025-07-01.<digest>.feather  User ID, Component, User Total, Capital Deployed, MTM, Max Loss
+#   2025-07/summary.<digest>.feather     per user and component: Days, MTM, Peak Capital Deployed, Worst Max Loss
+#   2025-07/daily.<digest>.feather       per date: Users, Capital Deployed, MTM, MTM to Date
+# Recording a date again with the same output changes nothing, and with a different output replaces
+# it; "sources" keeps the result cache key each date came from, so outputs of the same inputs are
+# skipped without being read again. A new date is folded into the aggregates; a replaced one has
+# them recomputed from the partitions. The manifest is replaced last, so a run that stops halfway leaves the month as it was.
+# JAINAM_LEDGER_DIR moves the ledger; set it empty to turn it off.
+LEDGER_DIR = os.environ.get('JAINAM_LEDGER_DIR', os.path.join(CACHE_DIR, 'ledger'))
+KEYS = ['User ID', 'Component', 'User Total']
+
+
+def available():
+    return pyarrow is not None and bool(LEDGER_DIR)
+
+
+def month_of(value):
+    # 'YYYY-MM' of a date, or of a month given as text
+    if isinstance(value, str):
+        return datetime.datetime.strptime(value, '%Y-%m').strftime('%Y-%m')
+    return value.strftime('%Y-%m')
+
+
+def _month_path(month):
+    return os.path.join(LEDGER_DIR, month)
+
+
+def entries(output):
+    # One row per user and component of an output. Component rows carry the user they belong to;
+    # the user's own row is the User Total and holds the user's Max Loss.
+    ids = output['User ID']
+    owner = ids.ffill()
+    keep = (owner.notna() & output['Component'].notna()).to_numpy()
+    is_user = ids.notna().to_numpy()[keep]
+    frame = pd.DataFrame({
+        'User ID': owner[keep].astype(str).to_numpy(),
+        'Component': output['Component'][keep].astype(str).to_numpy(),
+        'User Total': is_user,
+        'Capital Deployed': pd.to_numeric(output['Capital Deployed'][keep], errors='coerce').to_numpy(dtype=float),
+        'MTM': pd.to_numeric(output['MTM'][keep], errors='coerce').to_numpy(dtype=float),
+    })
+    max_loss = output[['User ID (SL)', 'Max Loss']].dropna(subset=['User ID (SL)'])
+    max_loss = pd.Series(pd.to_numeric(max_loss['Max Loss'], errors='coerce').to_numpy(dtype=float),
+                         index=max_loss['User ID (SL)'].astype(str).to_numpy())
+    max_loss = max_loss[~max_loss.index.duplicated()]
+    frame['Max Loss'] = frame['User ID'].map(max_loss).where(frame['User Total'])
+    return frame
+
+
+def _digest(frame):
+    values = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+    return hashlib.sha256(values.tobytes()).hexdigest()[:16]
+
+
+def _aggregate(frame):
+    # One date's contribution to the month's summary
+    groups = frame.groupby(KEYS, sort=False)
+    summary = pd.DataFrame({
+        'MTM': groups['MTM'].sum(min_count=1),
+        'Peak Capital Deployed': groups['Capital Deployed'].max(),
+        'Worst Max Loss': groups['Max Loss'].min(),
+    })
+    summary.insert(0, 'Days', 1)
+    return summary.reset_index()
+
+
+def _combine(summaries):
+    groups = pd.concat(summaries, ignore_index=True).groupby(KEYS, sort=False)
+    return pd.DataFrame({
+        'Days': groups['Days'].sum(),
+        'MTM': groups['MTM'].sum(min_count=1),
+        'Peak Capital Deployed': groups['Peak Capital Deployed'].max(),
+        'Worst Max Loss': groups['Worst Max Loss'].min(),
+    }).reset_index()
+
+
+def _daily_row(day, frame):
+    users = frame[frame['User Total']]
+    return {'Date': pd.Timestamp(day), 'Users': len(users),
+            'Capital Deployed': users['Capital Deployed'].sum(min_count=1), 'MTM': users['MTM'].sum(min_count=1)}
+
+
+def _daily(rows):
+    daily = pd.DataFrame(rows, columns=['Date', 'Users', 'Capital Deployed', 'MTM'])
+    daily = daily.sort_values('Date', ignore_index=True)
+    daily['MTM to Date'] = daily['MTM'].cumsum()
+    return daily
+
+
+def _read(path, name):
+    return pyarrow.feather.read_table(os.path.join(path, name), memory_map=True).to_pandas()
+
+
+def _manifest(path):
+    try:
+        with open(os.path.join(path, 'manifest.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'dates': {}, 'sources': {}, 'summary': None, 'daily': None}
+
+
+@contextlib.contextmanager
+def _locked(path):
+    # One writer per month at a time, across the app's sessions and the job workers
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, '.lock'), 'w') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def _write_manifest(path, entry):
+    tmp = os.path.join(path, f"manifest.json.{os.getpid()}.tmp")
+    with open(tmp, 'w') as f:
+        json.dump(entry, f)
+    os.replace(tmp, os.path.join(path, 'manifest.json'))
+
+
+def _record_month(path, frames, sources):
+    manifest = _manifest(path)
+    changed = {}
+    for day, frame in frames.items():
+        digest = _digest(frame)
+        if manifest['dates'].get(day.isoformat()) != digest:
+            changed[day] = (frame, digest)
+    recorded = dict(manifest['sources'])
+    for day, key in sources.items():
+        if key is None:
+            recorded.pop(day.isoformat(), None)
+        else:
+            recorded[day.isoformat()] = key
+    if not changed:
+        if recorded != manifest['sources']:
+            _write_manifest(path, {**manifest, 'sources': recorded})
+        return []
+
+    dates = dict(manifest['dates'])
+    for day, (frame, digest) in changed.items():
+        frame.to_feather(os.path.join(path, f"{day.isoformat()}.{digest}.feather"))
+        dates[day.isoformat()] = digest
+    dates = dict(sorted(dates.items()))
+
+    if manifest['summary'] is not None and not any(day.isoformat() in manifest['dates'] for day in changed):
+        # Only new dates: fold them into the aggregates already there
+        summary = _combine([_read(path, manifest['summary'])]
+                           + [_aggregate(frame) for frame, _ in changed.values()])
+        daily = _read(path, manifest['daily']).drop(columns='MTM to Date').to_dict('records')
+        daily += [_daily_row(day, frame) for day, (frame, _) in changed.items()]
+    else:
+        frames = {day: frame for day, (frame, _) in changed.items()}
+        summary, daily = [], []
+        for day, digest in dates.items():
+            day = datetime.date.fromisoformat(day)
+            frame = frames[day] if day in frames else _read(path, f"{day.isoformat()}.{digest}.feather")
+            summary.append(_aggregate(frame))
+            daily.append(_daily_row(day, frame))
+        summary = _combine(summary)
+
+    generation = hashlib.sha256(json.dumps(dates).encode()).hexdigest()[:16]
+    entry = {'dates': dates, 'sources': recorded,
+             'summary': f"summary.{generation}.feather", 'daily': f"daily.{generation}.feather"}
+    summary.to_feather(os.path.join(path, entry['summary']))
+    _daily(daily).to_feather(os.path.join(path, entry['daily']))
+    _write_manifest(path, entry)
+
+    # Files the new manifest no longer refers to
+    current = {entry['summary'], entry['daily']} | {f"{day}.{digest}.feather" for day, digest in dates.items()}
+    for name in os.listdir(path):
+        if name.endswith('.feather') and name not in current:
+            with contextlib.suppress(OSError):
+                os.remove(os.path.join(path, name))
+    return sorted(changed)
+
+
+def record(outputs, sources=None):
+    # Add {date: output} to the ledger; returns the dates it wrote, new or changed.
+    # sources: {date: result cache key} of the inputs each output came from, where known
+    if not available():
+        return []
+    sources = sources or {}
+    months = {}
+    for day, output in outputs.items():
+        months.setdefault(month_of(day), {})[day] = output
+    written = []
+    for month, outputs in months.items():
+        path = _month_path(month)
+        recorded = _manifest(path)['sources']
+        outputs = {day: output for day, output in outputs.items()
+                   if sources.get(day) is None or recorded.get(day.isoformat()) != sources[day]}
+        if not outputs:
+            continue
+        try:
+            frames = {day: entries(output) for day, output in outputs.items()}
+            with _locked(path):
+                written += _record_month(path, frames, {day: sources.get(day) for day in frames})
+        except (OSError, KeyError, ValueError, TypeError, pyarrow.ArrowException):
+            continue
+    return written
+
+
+def recorded_dates(month):
+    if not available():
+        return []
+    return [datetime.date.fromisoformat(day) for day in _manifest(_month_path(month))['dates']]
+
+
+def month_to_date(month, user=None):
+    # Per user and component aggregates of the recorded dates of a month, memory-mapped; None if
+    # nothing is recorded for it. user: only that User ID's rows.
+    if not available():
+        return None
+    path = _month_path(month)
+    manifest = _manifest(path)
+    if manifest['summary'] is None:
+        return None
+    summary = _read(path, manifest['summary'])
+    if user is not None:
+        summary = summary[summary['User ID'] == user].reset_index(drop=True)
+    return summary
+
+
+def daily_totals(month):
+    # Per recorded date of a month: users, capital deployed and MTM of the user totals, and the
+    # cumulative MTM; None if nothing is recorded for it
+    if not available():
+        return None
+    path = _month_path(month)
+    manifest = _manifest(path)
+    if manifest['daily'] is None:
+        return None
+    return _read(path, manifest['daily'])
+
+
+def main(argv=None):
+    # Month-to-date summary: python ledger.py 2025-07 [--user JM10001] [--daily]
+    parser = argparse.ArgumentParser(description="Month-to-date figures from the ledger of processed dates.")
+    parser.add_argument('month', type=month_of, help="Month (YYYY-MM)")
+    parser.add_argument('--user', help="Only this User ID")
+    parser.add_argument('--daily', action='store_true', help="Totals per date instead of per user and component")
+    args = parser.parse_args(argv)
+
+    if not available():
+        raise SystemExit("The ledger needs pyarrow and JAINAM_LEDGER_DIR set")
+    frame = daily_totals(args.month) if args.daily else month_to_date(args.month, args.user)
+    if frame is None:
+        raise SystemExit(f"Nothing recorded for {args.month}")
+    dates = recorded_dates(args.month)
+    print(f"{args.month}: {len(dates)} dates recorded, {dates[0]} to {dates[-1]}")
+    with pd.option_context('display.max_rows', 100, 'display.width', 200):
+        print(frame.to_string(index=False) if len(frame) <= 100 else frame)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+import argparse
+import json
+import os
+import shutil
+
+import pandas as pd
+
+from cache import CACHE_DIR, content_hash
+
+try:
+    import pyarrow
+    import pyarrow.feather
+except ImportError:
+    pyarrow = None
+
+# Date-partitioned columnar copy of the Compiled MTM history (file1), one directory per workbook
+# content hash holding a manifest and one Feather file per calendar day:
+#   <digest>/manifest.json   {"columns": [...], "dates": ["2025-07-01", ...]}
+#   <digest>/2025-07-01.feather
+STORE_DIR = os.path.join(CACHE_DIR, 'mtm_store')
+MAX_STORES = 8
+
+
+def available():
+    return pyarrow is not None
+
+
+def _store_path(digest):
+    return os.path.join(STORE_DIR, digest)
+
+
+def _normalize(df):
+    # UserID as strings and Date as datetime64, or None when the history cannot be typed
+    # without changing how process() would have matched it
+    if 'UserID' not in df.columns or 'Date' not in df.columns:
+        return None
+    ids = df['UserID'].dropna()
+    if not ids.map(lambda value: isinstance(value, str)).all():
+        return None
+    dates = df['Date']
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        try:
+            # Only unambiguous ISO strings parse the same way regardless of which rows are present
+            dates = pd.to_datetime(dates, format='ISO8601')
+        except (ValueError, TypeError):
+            return None
+    df = df.assign(Date=dates)
+    return df[df['Date'].notna()].reset_index(drop=True)
+
+
+def import_history(df, digest):
+    # Write the partitions for one file1 frame; returns False if it cannot be stored
+    if not available():
+        return False
+    df = _normalize(df)
+    if df is None:
+        return False
+
+    os.makedirs(STORE_DIR, exist_ok=True)
+    path = _store_path(digest)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    try:
+        os.makedirs(tmp)
+        dates = []
+        for day, part in df.groupby(df['Date'].dt.date, sort=True):
+            part.reset_index(drop=True).to_feather(os.path.join(tmp, f"{day.isoformat()}.feather"))
+            dates.append(day.isoformat())
+        with open(os.path.join(tmp, 'manifest.json'), 'w') as f:
+            json.dump({'columns': [str(col) for col in df.columns], 'dates': dates}, f)
+    except (OSError, pyarrow.ArrowException, ValueError, TypeError):
+        shutil.rmtree(tmp, ignore_errors=True)
+        return False
+
+    # Another process may have imported the same workbook in the meantime (job and pool workers
+    # do on a fresh cache); its copy holds the same rows and stays
+    if os.path.exists(os.path.join(path, 'manifest.json')):
+        shutil.rmtree(tmp, ignore_errors=True)
+        return True
+    shutil.rmtree(path, ignore_errors=True)
+    try:
+        os.replace(tmp, path)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        return os.path.exists(os.path.join(path, 'manifest.json'))
+    _evict()
+    return True
+
+
+def _mtime(name):
+    # Stores removed by another process meanwhile sort last
+    try:
+        return os.path.getmtime(os.path.join(STORE_DIR, name))
+    except OSError:
+        return 0
+
+
+def _evict():
+    stores = [name for name in os.listdir(STORE_DIR) if not name.endswith('.tmp')]
+    stores.sort(key=_mtime, reverse=True)
+    for name in stores[MAX_STORES:]:
+        shutil.rmtree(os.path.join(STORE_DIR, name), ignore_errors=True)
+
+
+def load_partition(digest, date):
+    # Rows of one calendar day, memory-mapped; None if the workbook has not been imported
+    if not available():
+        return None
+    path = _store_path(digest)
+    try:
+        with open(os.path.join(path, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        return None
+
+    day = pd.to_datetime(date).date().isoformat()
+    if day not in manifest['dates']:
+        return pd.DataFrame(columns=manifest['columns'])
+    table = pyarrow.feather.read_table(os.path.join(path, f"{day}.feather"), memory_map=True)
+    return table.to_pandas()
+
+
+def main(argv=None):
+    # Import step: python mtm_store.py <Compiled MTM workbook or CSV>
+    from engine import FILE1_COLUMNS, check_frame, read_file
+
+    parser = argparse.ArgumentParser(description="Import a Compiled MTM Sheet into the date-partitioned store.")
+    parser.add_argument('source', help="Compiled MTM Sheet (xlsx/csv)")
+    args = parser.parse_args(argv)
+
+    if not available():
+        raise SystemExit("pyarrow is not installed")
+    df = check_frame(read_file(args.source, columns=FILE1_COLUMNS), 'file1')
+    digest = content_hash(args.source)
+    if not import_history(df, digest):
+        raise SystemExit(f"{args.source} cannot be stored: UserID must be text and Date a date column")
+    print(f"Imported {len(df)} rows of {args.source} into {_store_path(digest)}")
+
+
+if __name__ == '__main__':
+    main()
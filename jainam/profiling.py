@@ -0,0 +1,95 @@
+import json
+import logging
+import os
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# One JSON line per run on the 'jainam.profile' logger, and appended to JAINAM_PROFILE_LOG if set.
+# tracemalloc adds measurable overhead, so Python heap peaks are only traced on request.
+PROFILE_LOG = os.environ.get('JAINAM_PROFILE_LOG')
+TRACE_MEMORY = os.environ.get('JAINAM_PROFILE_TRACEMALLOC', '') not in ('', '0')
+
+logger = logging.getLogger('jainam.profile')
+
+
+def _rss_mb():
+    # Resident set size now; only where /proc is available
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _peak_rss_mb():
+    # High-water mark of the process so far (ru_maxrss is in KiB on Linux)
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class RunProfile:
+    # Wall time, memory and row counts of the stages of one run. Each lap() closes the stage
+    # that began at the previous lap (or when the profile was created) under the given name.
+    def __init__(self, trace_memory=TRACE_MEMORY):
+        self.stages = []
+        # tracemalloc is process-wide: leave it alone if something else is already tracing
+        self._trace = trace_memory and not tracemalloc.is_tracing()
+        if self._trace:
+            tracemalloc.start()
+        self._start = self._last = time.perf_counter()
+
+    def lap(self, name, rows=None):
+        now = time.perf_counter()
+        stage = {
+            'stage': name,
+            'seconds': round(now - self._last, 4),
+            'rows': rows,
+            'rss_mb': _round(_rss_mb()),
+            'peak_rss_mb': _round(_peak_rss_mb()),
+        }
+        if self._trace:
+            stage['traced_peak_mb'] = _round(tracemalloc.get_traced_memory()[1] / 2 ** 20)
+            tracemalloc.reset_peak()
+        self.stages.append(stage)
+        self._last = time.perf_counter()
+
+    def finish(self):
+        if self._trace:
+            tracemalloc.stop()
+            self._trace = False
+
+    def record(self, **context):
+        # The run as one JSON-ready dict; context says which run it was (dates, sheet, status, ...)
+        self.finish()
+        return {
+            'event': 'run_profile',
+            **context,
+            'total_seconds': round(time.perf_counter() - self._start, 4),
+            'stages': self.stages,
+        }
+
+
+class _NoProfile:
+    def lap(self, name, rows=None):
+        pass
+
+
+NO_PROFILE = _NoProfile()
+
+
+def _round(value):
+    return None if value is None else round(value, 1)
+
+
+def log_profile(record):
+    line = json.dumps(record, default=str)
+    logger.info(line)
+    if PROFILE_LOG:
+        with open(PROFILE_LOG, 'a') as f:
+            f.write(line + '\n')
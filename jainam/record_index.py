@@ -0,0 +1,142 @@
+import hashlib
+import io
+import json
+import os
+import re
+
+from cache import CACHE_DIR
+
+# Per-date block index of the 'Record' sheet of file2, one JSON file per workbook content hash:
+#   {"blocks": [[date or null, header_row, last_row], ...], "checkpoint": {"row": n, "digest": hex} or null}
+# Rows are 1-based sheet row numbers. The checkpoint digest covers the raw sheet XML of every row
+# above the last block, so a workbook that only had rows appended can reuse the older blocks.
+INDEX_DIR = os.path.join(CACHE_DIR, 'record_index')
+MAX_INDEXES = 32
+
+_SHEET_DATA = re.compile(rb'<(?:\w+:)?sheetData>')
+_CHUNK_SIZE = 1 << 20
+
+
+def load_index(digest):
+    try:
+        with open(os.path.join(INDEX_DIR, f"{digest}.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_index(digest, entry):
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    path = os.path.join(INDEX_DIR, f"{digest}.json")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(entry, f)
+    os.replace(tmp, path)
+    for stale in recent_indexes()[MAX_INDEXES:]:
+        try:
+            os.remove(os.path.join(INDEX_DIR, f"{stale}.json"))
+        except OSError:
+            pass
+
+
+def recent_indexes():
+    # Digests of stored indexes, most recently written first
+    try:
+        names = [name for name in os.listdir(INDEX_DIR) if name.endswith('.json')]
+    except OSError:
+        return []
+    names.sort(key=lambda name: os.path.getmtime(os.path.join(INDEX_DIR, name)), reverse=True)
+    return [name[:-len('.json')] for name in names]
+
+
+def _seek_row(src, row):
+    # Read the worksheet XML up to <row r="row">. Returns (head, rest, digest) where head ends
+    # with the <sheetData> tag, rest starts at the row element and digest covers the rows skipped.
+    # None if the row cannot be found this way (e.g. rows written without an r attribute).
+    buf = b''
+    while True:
+        match = _SHEET_DATA.search(buf)
+        if match:
+            break
+        chunk = src.read(_CHUNK_SIZE)
+        if not chunk:
+            return None
+        buf += chunk
+    head, buf = buf[:match.end()], buf[match.end():]
+
+    marker = re.compile(rb'<(?:\w+:)?row r="%d"' % row)
+    digest = hashlib.sha256()
+    while True:
+        match = marker.search(buf)
+        if match:
+            digest.update(buf[:match.start()])
+            return head, buf[match.start():], digest.hexdigest()
+        # Keep a tail in case the marker straddles two chunks
+        digest.update(buf[:-64])
+        buf = buf[-64:]
+        chunk = src.read(_CHUNK_SIZE)
+        if not chunk:
+            return None
+        buf += chunk
+
+
+class _SplicedSource(io.RawIOBase):
+    # Worksheet XML with the skipped rows cut out, read by openpyxl as if it were the whole part
+    def __init__(self, pending, src):
+        self._pending = pending
+        self._src = src
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if self._pending:
+            n = min(len(b), len(self._pending))
+            b[:n] = self._pending[:n]
+            self._pending = self._pending[n:]
+            return n
+        data = self._src.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self._src.close()
+        super().close()
+
+
+def prefix_digest(ws, row):
+    # Digest of the raw XML of every row above `row` in a read-only worksheet
+    try:
+        src = ws.parent._archive.open(ws._worksheet_path)
+    except AttributeError:
+        return None
+    try:
+        found = _seek_row(src, row)
+    finally:
+        src.close()
+    return found[2] if found else None
+
+
+def iter_rows_from(ws, first_row, last_row=None):
+    # (row number, values) pairs of a read-only worksheet from first_row on. The rows above are
+    # skipped at the byte level instead of being parsed, falling back to openpyxl's own min_row.
+    stream = None
+    try:
+        src = ws.parent._archive.open(ws._worksheet_path)
+        found = _seek_row(src, first_row)
+        if found is None:
+            src.close()
+        else:
+            stream = _SplicedSource(found[0] + found[1], src)
+    except AttributeError:
+        pass
+
+    if stream is not None:
+        ws._get_source = lambda: stream
+    try:
+        rows = ws.iter_rows(min_row=first_row, max_row=last_row, values_only=True)
+        yield from enumerate(rows, start=first_row)
+    finally:
+        if stream is not None:
+            del ws._get_source
+            stream.close()
@@ -0,0 +1,177 @@
+import datetime
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from cache import CACHE_DIR, content_hash
+
+try:
+    import pyarrow
+    import pyarrow.feather
+except ImportError:
+    pyarrow = None
+
+# Reconciled outputs on local disk, one Feather file per (file1, file2, file3 content hashes,
+# sheet name, date), shared by every session and process on the machine. The original column
+# names go in the file's schema metadata, since Feather only takes strings. Dates that failed
+# with an error the inputs alone decide (no data for the date, a missing column) are kept as
+# <key>.error.json instead. Once the files add up to more than JAINAM_RESULT_CACHE_MB, the least
+# recently used are removed; 0 turns the cache off.
+# Bump RESULT_VERSION whenever a change to the reconciliation changes what it outputs.
+RESULT_DIR = os.path.join(CACHE_DIR, 'result_cache')
+MAX_MB = int(os.environ.get('JAINAM_RESULT_CACHE_MB', 512))
+RESULT_VERSION = 1
+_METADATA_KEY = b'jainam'
+ERROR_SUFFIX = '.error.json'
+
+
+def available():
+    return pyarrow is not None and MAX_MB > 0
+
+
+def input_digests(sources):
+    # Content hashes of the three inputs; None if one cannot be read, so the run reports it
+    try:
+        return [content_hash(source) for source in sources]
+    except (OSError, ValueError):
+        return None
+
+
+def result_key(digests, sheet_name, day):
+    # day: the calendar day as a datetime.date
+    parts = [RESULT_VERSION, *digests, sheet_name, day.isoformat()]
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+
+def _path(key, suffix='.feather'):
+    return os.path.join(RESULT_DIR, f"{key}{suffix}")
+
+
+def _encode_name(name):
+    if isinstance(name, str):
+        return name
+    if type(name) is datetime.datetime:
+        return {'datetime': name.isoformat()}
+    if isinstance(name, (int, float)) and not isinstance(name, bool) and not np.isnan(name):
+        return {'number': name}
+    raise TypeError(f"unsupported column name {name!r}")
+
+
+def _decode_name(name):
+    if isinstance(name, str):
+        return name
+    if 'datetime' in name:
+        return datetime.datetime.fromisoformat(name['datetime'])
+    return name['number']
+
+
+def _to_frame(table):
+    names = json.loads(table.schema.metadata[_METADATA_KEY])['columns']
+    df = table.to_pandas()
+    # Arrow hands back missing text as None where the output had NaN
+    for n in range(df.shape[1]):
+        if df.dtypes.iloc[n] == object:
+            values = df.iloc[:, n].to_numpy(dtype=object, copy=True)
+            values[pd.isna(values)] = np.nan
+            df.isetitem(n, values)
+    df.columns = [_decode_name(name) for name in names]
+    return df
+
+
+def load_result(key):
+    # The cached output, or None if there is none
+    if key is None or not available():
+        return None
+    path = _path(key)
+    try:
+        table = pyarrow.feather.read_table(path)
+        os.utime(path)
+    except (OSError, pyarrow.ArrowException):
+        return None
+    return _to_frame(table)
+
+
+def load_error(key):
+    # (error type name, message) of a cached failure, or None
+    if key is None or not available():
+        return None
+    path = _path(key, ERROR_SUFFIX)
+    try:
+        with open(path) as f:
+            entry = json.load(f)
+        os.utime(path)
+    except (OSError, ValueError):
+        return None
+    return entry['error'], entry['message']
+
+
+def save_error(key, error, message):
+    if key is None or not available():
+        return False
+    os.makedirs(RESULT_DIR, exist_ok=True)
+    path = _path(key, ERROR_SUFFIX)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'w') as f:
+            json.dump({'error': error, 'message': message}, f)
+        os.replace(tmp, path)
+    except OSError:
+        return False
+    _evict()
+    return True
+
+
+def save_result(key, df):
+    # Store one output; returns False if it would not come back identical
+    if key is None or not available():
+        return False
+    try:
+        names = [_encode_name(name) for name in df.columns]
+        data = df.set_axis([str(n) for n in range(df.shape[1])], axis=1)
+        table = pyarrow.Table.from_pandas(data, preserve_index=False)
+        table = table.replace_schema_metadata({**table.schema.metadata,
+                                               _METADATA_KEY: json.dumps({'columns': names})})
+        if not _to_frame(table).equals(df) or not isinstance(df.index, pd.RangeIndex):
+            return False
+    except (TypeError, ValueError, pyarrow.ArrowException):
+        return False
+
+    os.makedirs(RESULT_DIR, exist_ok=True)
+    path = _path(key)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        pyarrow.feather.write_feather(table, tmp)
+        os.replace(tmp, path)
+    except (OSError, pyarrow.ArrowException):
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return False
+    _evict()
+    return True
+
+
+def _evict():
+    # Least recently used first, until the cache fits in MAX_MB
+    entries = []
+    for name in os.listdir(RESULT_DIR):
+        if not name.endswith(('.feather', ERROR_SUFFIX)):
+            continue
+        try:
+            stat = os.stat(os.path.join(RESULT_DIR, name))
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, name))
+    entries.sort(reverse=True)
+    total = 0
+    for _, size, name in entries:
+        total += size
+        if total > MAX_MB * 1024 * 1024:
+            try:
+                os.remove(os.path.join(RESULT_DIR, name))
+            except OSError:
+                pass
@@ -0,0 +1,188 @@
+import datetime
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+from flask import Flask, Response, abort, jsonify, render_template, request, url_for
+
+import engine
+import jobs
+from engine import ProcessingError, Upload, combine_outputs, iter_csv, process
+from profiling import RunProfile, log_profile
+
+# Reconciliations run in a bounded pool of worker processes. Up to WEB_QUEUE more requests wait for
+# a free worker; beyond that the service answers 503 straight away instead of piling up uploads.
+WEB_WORKERS = int(os.environ.get('JAINAM_WEB_WORKERS', os.cpu_count() or 1))
+WEB_QUEUE = int(os.environ.get('JAINAM_WEB_QUEUE', 2 * WEB_WORKERS))
+REQUEST_TIMEOUT = float(os.environ.get('JAINAM_REQUEST_TIMEOUT', 300))
+MAX_UPLOAD_MB = int(os.environ.get('JAINAM_MAX_UPLOAD_MB', 200))
+RETRY_AFTER = 30
+
+app = Flask(__name__)
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_MB * 1024 * 1024
+
+_slots = threading.BoundedSemaphore(WEB_WORKERS + WEB_QUEUE)
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def init_worker():
+    # Each request already has a worker process of its own, so it parses its three files in turn
+    engine.LOAD_WORKERS = 1
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+
+def reconcile(mtm, allocation, daily, sheet_name, date):
+    # Runs in a pool worker: process() with its run profile logged
+    profile = RunProfile()
+    try:
+        output = process(mtm, allocation, daily, sheet_name, date, profile=profile)
+    except Exception:
+        log_profile(profile.record(status='failed', sheet_name=sheet_name, dates=[date]))
+        raise
+    log_profile(profile.record(status='done', sheet_name=sheet_name, dates=[date]))
+    return output
+
+
+def worker_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=WEB_WORKERS, mp_context=get_context('spawn'),
+                                        initializer=init_worker)
+        return _pool
+
+
+def _discard_pool(pool):
+    # A worker died (out of memory, killed); the next request starts a fresh pool
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def text_response(message, status, **headers):
+    return Response(message, status=status, mimetype='text/plain', headers=headers)
+
+
+@app.route('/')
+def index():
+    return render_template('index.html')
+
+
+def parse_date(value):
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        abort(text_response(f"Invalid date format: {value}. Please use YYYY-MM-DD.", 400))
+
+
+def read_form():
+    # The template's form: the three uploads, the sheet name and the date
+    files = [request.files.get(key) for key in ('file1', 'file2', 'file3')]
+    sheet_name = request.form.get('sheet_name', '')
+    date_text = request.form.get('date', '')
+    if not all(files) or not all(file.filename for file in files) or not sheet_name or not date_text:
+        abort(text_response("All fields are required.", 400))
+    return files, sheet_name, parse_date(date_text)
+
+
+def csv_response(output, filename):
+    return Response(iter_csv(output), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
+@app.route('/process', methods=['POST'])
+def process_files():
+    files, sheet_name, date = read_form()
+
+    # The slot is held until the worker finishes, even if this request has already timed out
+    if not _slots.acquire(blocking=False):
+        return text_response("The server is busy processing other files. Please try again shortly.", 503,
+                             **{'Retry-After': str(RETRY_AFTER)})
+    try:
+        uploads = [Upload(file.read(), file.filename) for file in files]
+        pool = worker_pool()
+        future = pool.submit(reconcile, *uploads, sheet_name, date)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda future: _slots.release())
+
+    try:
+        output = future.result(timeout=REQUEST_TIMEOUT)
+    except TimeoutError:
+        future.cancel()
+        return text_response(f"Processing took longer than {REQUEST_TIMEOUT:g} seconds and was abandoned.", 504)
+    except ProcessingError as e:
+        return text_response(str(e), 422)
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        return text_response("Error processing files: the worker processing them stopped unexpectedly.", 500)
+    except Exception as e:
+        return text_response(f"Error processing files: {str(e)}", 500)
+
+    return csv_response(output, f"jainam_{date.strftime('%Y-%m-%d')}.csv")
+
+
+# Queued jobs for long runs: POST /jobs returns a job ID at once, GET /jobs/<id> reports its stage
+# and GET /jobs/<id>/result returns the CSV when it is done. An optional end_date queues a range.
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    files, sheet_name, date = read_form()
+    end = parse_date(request.form['end_date']) if request.form.get('end_date') else date
+    if end < date:
+        return text_response("The end date must not be before the start date.", 400)
+    dates = [date + datetime.timedelta(days=n) for n in range((end - date).days + 1)]
+    uploads = [Upload(file.read(), file.filename) for file in files]
+    try:
+        engine.preflight(*uploads, sheet_name)
+    except ProcessingError as e:
+        return text_response(str(e), 422)
+    job_id = jobs.submit(*uploads, sheet_name, dates)
+    jobs.ensure_workers()
+    return jsonify(id=job_id, status_url=url_for('job_status', job_id=job_id),
+                   result_url=url_for('job_result', job_id=job_id)), 202
+
+
+def find_job(job_id):
+    job = jobs.status(job_id)
+    if job is None:
+        abort(text_response(f"No job {job_id}.", 404))
+    return job
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = find_job(job_id)
+    return jsonify(id=job_id, status=job['status'], progress=job['progress'], stage=job['stage'],
+                   queue_position=job['queue_position'], error=job['error'], profile=job['profile'],
+                   dates=[date.strftime('%Y-%m-%d') for date in job['dates']])
+
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    job = find_job(job_id)
+    if job['status'] == 'failed':
+        return text_response(job['error'], 422)
+    if job['status'] != 'done':
+        return text_response(f"The job is {job['status']} ({job['progress']}% {job['stage']}).", 409)
+    outputs, _ = jobs.result(job_id)
+    first, last = job['dates'][0], job['dates'][-1]
+    if len(job['dates']) == 1:
+        return csv_response(outputs[first], f"jainam_{first.strftime('%Y-%m-%d')}.csv")
+    return csv_response(combine_outputs(outputs),
+                        f"jainam_{first.strftime('%Y-%m-%d')}_{last.strftime('%Y-%m-%d')}.csv")
+
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    return text_response(f"The uploaded files exceed the {MAX_UPLOAD_MB} MB limit.", 413)
+
+
+if __name__ == '__main__':
+    app.run(debug=False)
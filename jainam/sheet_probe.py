@@ -0,0 +1,185 @@
+import html
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+# Reads the little a preflight check needs from an .xlsx straight out of its zip parts, without
+# loading the workbook: the sheet names, and the rows of a sheet as raw XML that is only parsed
+# cell by cell where asked. Worksheet XML is scanned at the byte level in chunks, as in
+# record_index; shared strings are read once, on the first cell that refers to one.
+_CHUNK_SIZE = 1 << 20
+_SHEET_DATA = re.compile(rb'<(?:(\w+):)?sheetData>')
+_CELL = re.compile(rb'<(?:\w+:)?c\b([^>]*?)(?:/>|>(.*?)</(?:\w+:)?c>)', re.S)
+# A row's first cell, if it holds a string
+_FIRST_TEXT = re.compile(rb'\s*<(?:\w+:)?c\b([^>]*\bt="(?:s|inlineStr|str)"[^>]*)>(.*?)</(?:\w+:)?c>', re.S)
+_REF = re.compile(rb'\br="([A-Z]*)(\d*)"')
+_TYPE = re.compile(rb'\bt="(\w+)"')
+_VALUE = re.compile(rb'<(?:\w+:)?v>(.*?)</(?:\w+:)?v>', re.S)
+_TEXT = re.compile(rb'<(?:\w+:)?t\b[^>]*>(.*?)</(?:\w+:)?t>', re.S)
+_PHONETIC = re.compile(rb'<(?:\w+:)?rPh\b.*?</(?:\w+:)?rPh>', re.S)
+_SHARED_STRING = re.compile(rb'<(?:\w+:)?si>(.*?)</(?:\w+:)?si>|<(?:\w+:)?si/>', re.S)
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _attribute(element, name):
+    # An attribute by its local name, whatever its namespace
+    for key, value in element.attrib.items():
+        if _local(key) == name:
+            return value
+    return None
+
+
+def _part(base, target):
+    # Zip part a relationship target points at, relative to the part that declares it
+    if target.startswith('/'):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base), target))
+
+
+def _rels(archive, part):
+    path = posixpath.join(posixpath.dirname(part), '_rels', f"{posixpath.basename(part)}.rels")
+    return {_attribute(rel, 'Id'): (_attribute(rel, 'Type') or '', _part(part, _attribute(rel, 'Target')))
+            for rel in ET.fromstring(archive.read(path)) if _local(rel.tag) == 'Relationship'}
+
+
+def _text(inner):
+    return html.unescape(b''.join(_TEXT.findall(_PHONETIC.sub(b'', inner))).decode('utf-8'))
+
+
+def _column(letters):
+    # 'A' -> 0, 'AB' -> 27
+    number = 0
+    for letter in letters:
+        number = number * 26 + letter - 64
+    return number - 1
+
+
+class SheetProbe:
+    # One .xlsx opened as a zip archive; raises zipfile.BadZipFile, KeyError or ParseError for a
+    # file that is not one
+    def __init__(self, source):
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        self.archive = zipfile.ZipFile(source)
+        try:
+            workbook = next(target for kind, target in _rels(self.archive, '').values()
+                            if kind.endswith('/officeDocument'))
+            rels = _rels(self.archive, workbook)
+            self.sheets = {}
+            for element in ET.fromstring(self.archive.read(workbook)).iter():
+                if _local(element.tag) == 'sheet':
+                    self.sheets[element.get('name')] = rels[_attribute(element, 'id')][1]
+            self._strings_part = next((target for kind, target in rels.values()
+                                       if kind.endswith('/sharedStrings')), None)
+        except Exception:
+            self.archive.close()
+            raise
+        self._strings = None
+
+    @property
+    def sheet_names(self):
+        return list(self.sheets)
+
+    def rows(self, sheet):
+        # (row number, raw XML of the row's cells) in sheet order; numbers start at 1. Rows do not
+        # nest, so the sheet data is split on the row tag rather than matched row by row.
+        with self.archive.open(self.sheets[sheet]) as src:
+            data = b''
+            while True:
+                chunk = src.read(_CHUNK_SIZE)
+                data += chunk
+                match = _SHEET_DATA.search(data)
+                if match:
+                    break
+                if not chunk:
+                    return
+                data = data[-64:]
+            prefix = match.group(1) + b':' if match.group(1) else b''
+            row_tag = b'<' + prefix + b'row'
+            end_tag = b'</' + prefix + b'sheetData>'
+            data = data[match.end():]
+            number = 0
+            while True:
+                chunk = src.read(_CHUNK_SIZE)
+                data += chunk
+                end = data.find(end_tag)
+                last = not chunk or end >= 0
+                if end >= 0:
+                    data = data[:end]
+                # The first piece comes before any row; the last may still be being read
+                pieces = data.split(row_tag)
+                if last:
+                    data = b''
+                elif len(pieces) > 1:
+                    data = row_tag + pieces.pop()
+                else:
+                    data = pieces.pop()
+                for piece in pieces[1:]:
+                    attrs, _, body = piece.partition(b'>')
+                    ref = _REF.search(attrs)
+                    number = int(ref.group(2)) if ref and ref.group(2) else number + 1
+                    yield number, b'' if attrs.endswith(b'/') else body
+                if last:
+                    return
+
+    def cells(self, body, first_only=False):
+        # (column number from 0, value) of each cell in a row's XML; strings as str, numbers as
+        # float, booleans as bool, blanks as None
+        cells = []
+        column = -1
+        for cell in _CELL.finditer(body):
+            attrs, inner = cell.groups()
+            ref = _REF.search(attrs)
+            column = _column(ref.group(1)) if ref and ref.group(1) else column + 1
+            cells.append((column, self._value(attrs, inner)))
+            if first_only:
+                break
+        return cells
+
+    def first_text(self, body):
+        # The string in column A of a row's XML, None if there is none. Cheaper than cells() on a
+        # long sheet: rows that start with a number or a blank are passed over by one regex.
+        cell = _FIRST_TEXT.match(body)
+        if cell is None:
+            return None
+        ref = _REF.search(cell.group(1))
+        if ref and ref.group(1) not in (b'', b'A'):
+            return None
+        value = self._value(cell.group(1), cell.group(2))
+        return value if isinstance(value, str) else None
+
+    def _value(self, attrs, inner):
+        if inner is None:
+            return None
+        kind = _TYPE.search(attrs)
+        kind = kind.group(1) if kind else b'n'
+        if kind == b'inlineStr':
+            return _text(inner)
+        value = _VALUE.search(inner)
+        if value is None:
+            return None
+        value = value.group(1)
+        if kind == b's':
+            return self.shared_string(int(value))
+        if kind == b'b':
+            return value.strip() == b'1'
+        if kind in (b'str', b'e'):
+            return html.unescape(value.decode('utf-8'))
+        try:
+            return float(value)
+        except ValueError:
+            return html.unescape(value.decode('utf-8'))
+
+    def shared_string(self, index):
+        if self._strings is None:
+            data = self.archive.read(self._strings_part) if self._strings_part else b''
+            self._strings = [_text(item.group(1)) if item.group(1) is not None else ''
+                             for item in _SHARED_STRING.finditer(data)]
+        return self._strings[index] if index < len(self._strings) else None
+
+    def close(self):
+        self.archive.close()
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+# Server side of the results table: the search, the sort and the paging work on row positions,
+# and only the rows of the page on screen are sent to the browser. A user's component rows leave
+# User ID blank under the user's own row, so they are searched and sorted under that user; the
+# Max SL columns to the right carry their own IDs.
+SEARCH_COLUMNS = ['User ID', 'Component', 'User ID (SL)', 'Component (SL)']
+SORT_COLUMNS = ['User ID', 'Component']
+PAGE_SIZES = [50, 100, 250, 500]
+
+
+def user_ids(output):
+    # The User ID each row belongs to
+    if 'User ID' not in output.columns:
+        return None
+    return output['User ID'].ffill().to_numpy(dtype=object)
+
+
+def row_keys(output):
+    # Lower-cased search and sort text of every row, worked out once per output
+    keys = pd.DataFrame(index=pd.RangeIndex(len(output)))
+    ids = user_ids(output)
+    for name in SEARCH_COLUMNS:
+        if name in output.columns:
+            values = ids if name == 'User ID' else output[name].to_numpy(dtype=object)
+            keys[name] = pd.Series(values, index=keys.index).fillna('').astype(str).str.lower()
+    return keys
+
+
+def select_rows(keys, query='', sort_by=None, descending=False):
+    # Positions of the rows that match the search, in the order they are shown
+    rows = np.arange(len(keys))
+    query = query.strip().lower()
+    if query:
+        match = np.zeros(len(rows), dtype=bool)
+        for name in SEARCH_COLUMNS:
+            if name in keys.columns:
+                match |= keys[name].str.contains(query, regex=False).to_numpy()
+        rows = rows[match]
+    if sort_by is not None and sort_by in keys.columns:
+        # Stable, so rows with the same key keep their order in the output
+        rows = keys[sort_by].iloc[rows].sort_values(ascending=not descending, kind='stable').index.to_numpy()
+    return rows
+
+
+def page_count(rows, size):
+    return max(1, -(-len(rows) // size))
+
+
+def page(output, rows, number, size, ids=None):
+    # Page `number` (from 1) of the selected rows. A component row whose user's row is not right
+    # above it on the page shows the User ID it belongs to.
+    chosen = rows[(number - 1) * size:number * size]
+    shown = output.iloc[chosen]
+    if ids is not None and len(chosen):
+        above = np.concatenate([[-1], chosen[:-1] + 1])
+        blank = shown['User ID'].isna().to_numpy()
+        detached = blank & (above != chosen)
+        if detached.any():
+            values = shown['User ID'].to_numpy(dtype=object, copy=True)
+            values[detached] = ids[chosen[detached]]
+            shown = shown.copy(deep=False)
+            shown.isetitem(shown.columns.get_loc('User ID'), values)
+    return shown